@@ -0,0 +1,178 @@
+import asyncio
+import logging
+import math
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, TypeVar
+
+from botocore.exceptions import ClientError
+
+from metrics import ADMISSION_LIMIT, ADMISSION_REJECTIONS, ADMISSION_WAITING, MODEL_RETRIES
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+THROTTLING_CODES = {"ThrottlingException", "TooManyRequestsException", "ServiceQuotaExceededException"}
+RETRYABLE_CODES = THROTTLING_CODES | {
+    "ServiceUnavailableException",
+    "InternalServerException",
+    "ModelNotReadyException",
+    "ModelTimeoutException",
+}
+
+class AdmissionRejected(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__(f"Model capacity exhausted, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+def error_code(e: ClientError) -> str:
+    return e.response.get('Error', {}).get('Code', '')
+
+class AdmissionController:
+    """Client-side admission for model calls.
+
+    A call needs a concurrency slot and a token from the rate bucket. The
+    concurrency limit adapts AIMD-style: it shrinks by ``backoff_factor`` when the
+    model throttles us and grows by ``1/limit`` per success, up to
+    ``max_concurrency``. At most ``max_queue`` callers wait for admission, each for
+    at most ``queue_timeout``; beyond that ``AdmissionRejected`` is raised so the
+    API can answer 429 instead of piling up. ``call`` also retries retryable
+    errors with full-jitter exponential backoff.
+    """
+
+    def __init__(
+        self,
+        rate: float = 10.0,
+        burst: int = 20,
+        max_concurrency: int = 32,
+        min_concurrency: int = 1,
+        max_queue: int = 100,
+        queue_timeout: float = 10.0,
+        max_retries: int = 3,
+        backoff_base: float = 0.25,
+        backoff_max: float = 4.0,
+        backoff_factor: float = 0.7
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.backoff_factor = backoff_factor
+
+        self.limit = float(max_concurrency)
+        self.active = 0
+        self.waiting = 0
+        self.tokens = float(burst)
+        self.last_refill = time.monotonic()
+        self.last_decrease = 0.0
+        # Created on first use: on Python 3.9 asyncio primitives bind to the loop current at construction
+        self._condition = None
+        ADMISSION_LIMIT.set(self.limit)
+
+    @property
+    def condition(self) -> asyncio.Condition:
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    def retry_after(self) -> int:
+        # Rough time for the current backlog to drain at the configured rate
+        if self.rate <= 0:
+            return 1
+        return min(30, max(1, math.ceil((self.waiting + self.active) / self.rate)))
+
+    def _take_token(self) -> float:
+        # Returns 0 if a token was taken, otherwise how long until one is available
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    async def _acquire(self):
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.active < int(self.limit))
+            self.active += 1
+        try:
+            while True:
+                delay = self._take_token()
+                if not delay:
+                    return
+                await asyncio.sleep(delay)
+        except BaseException:
+            await self._release()
+            raise
+
+    async def _release(self):
+        async with self.condition:
+            self.active -= 1
+            self.condition.notify_all()
+
+    @asynccontextmanager
+    async def slot(self):
+        if self.waiting >= self.max_queue:
+            ADMISSION_REJECTIONS.labels("queue_full").inc()
+            raise AdmissionRejected(self.retry_after())
+        self.waiting += 1
+        ADMISSION_WAITING.set(self.waiting)
+        try:
+            await asyncio.wait_for(self._acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            ADMISSION_REJECTIONS.labels("queue_timeout").inc()
+            raise AdmissionRejected(self.retry_after())
+        finally:
+            self.waiting -= 1
+            ADMISSION_WAITING.set(self.waiting)
+        try:
+            yield
+        finally:
+            await self._release()
+
+    def on_success(self):
+        if self.limit < self.max_concurrency:
+            self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+            ADMISSION_LIMIT.set(self.limit)
+
+    def on_throttle(self):
+        # Concurrent calls all see the same throttling burst; back off once per second
+        now = time.monotonic()
+        if now - self.last_decrease < 1.0:
+            return
+        self.last_decrease = now
+        self.limit = max(self.min_concurrency, self.limit * self.backoff_factor)
+        ADMISSION_LIMIT.set(self.limit)
+        logger.warning(f"Model throttling, concurrency limit lowered to {self.limit:.1f}")
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    async def call(self, fn: Callable[[], Awaitable[T]]) -> T:
+        attempt = 0
+        while True:
+            async with self.slot():
+                try:
+                    result = await fn()
+                except ClientError as e:
+                    code = error_code(e)
+                    if code in THROTTLING_CODES:
+                        self.on_throttle()
+                    if code not in RETRYABLE_CODES or attempt >= self.max_retries:
+                        raise
+                    MODEL_RETRIES.labels(code).inc()
+                else:
+                    self.on_success()
+                    return result
+            # Back off outside the slot so other callers can use it meanwhile
+            await asyncio.sleep(self.backoff(attempt))
+            attempt += 1
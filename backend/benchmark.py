@@ -0,0 +1,157 @@
+"""Load-test harness for the recipe API, runnable without AWS.
+
+Drives the FastAPI app in-process over ASGI with a mix of hot (repeated, cacheable)
+and cold (unique) ingredient sets. The model is the StubProvider, with configurable
+latency distribution, error rate and throttling; Redis is fakeredis unless
+--redis-url points at a real instance (e.g. a local container).
+
+    pip install -r requirements-dev.txt
+    python benchmark.py --requests 500 --concurrency 50 --hot-ratio 0.8
+    python benchmark.py --redis-url redis://localhost:6379/15 --json > run.json
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import Dict, List
+
+import httpx
+
+import main
+from providers import StubProvider
+
+INGREDIENTS = [
+    "chicken", "paneer", "egg", "tofu", "shrimp", "lamb", "potato", "tomato", "onion",
+    "garlic", "ginger", "green chili", "bell pepper", "spinach", "mushroom", "corn",
+    "cheddar", "mozzarella", "yogurt", "butter", "rice", "bread", "tortilla", "pasta",
+    "chickpea", "lentil", "lemon", "lime", "coriander", "mint", "cumin", "turmeric",
+    "paprika", "honey", "soy sauce", "sriracha", "mayonnaise", "avocado", "cabbage",
+    "carrot", "cauliflower", "okra", "eggplant", "zucchini", "peanut", "cashew",
+]
+
+def build_traffic(requests: int, hot_ratio: float, hot_sets: int, seed: int) -> List[Dict]:
+    rng = random.Random(seed)
+    hot = [rng.sample(INGREDIENTS, rng.randint(2, 5)) for _ in range(hot_sets)]
+    traffic = []
+    for i in range(requests):
+        if rng.random() < hot_ratio:
+            ingredients = list(rng.choice(hot))
+        else:
+            # The marker keeps cold requests unique even if the sample repeats
+            ingredients = rng.sample(INGREDIENTS, rng.randint(2, 6)) + [f"cold-{i}"]
+        traffic.append({"ingredients": ingredients})
+    return traffic
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+async def start_app(provider: StubProvider, redis_url: str = None):
+    # The app in-process on the given stub model, with fakeredis unless a Redis URL is given
+    main.model_provider = provider
+    if redis_url:
+        main.redis_client = main.redis.from_url(redis_url, decode_responses=True)
+        main.cache_redis = main.redis.from_url(redis_url)
+        await main.redis_client.flushdb()
+    else:
+        import fakeredis
+        import fakeredis.aioredis
+        server = fakeredis.FakeServer()
+        main.redis_client = fakeredis.aioredis.FakeRedis(server=server, decode_responses=True)
+        main.cache_redis = fakeredis.aioredis.FakeRedis(server=server)
+    await main.startup()
+
+async def run(args) -> Dict:
+    provider = StubProvider(
+        latency_distribution=args.distribution,
+        latency_mean=args.latency_mean,
+        latency_sigma=args.latency_sigma,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        seed=args.seed
+    )
+    await start_app(provider, args.redis_url)
+
+    traffic = build_traffic(args.requests, args.hot_ratio, args.hot_sets, args.seed)
+    queue: asyncio.Queue = asyncio.Queue()
+    for body in traffic:
+        queue.put_nowait(body)
+
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    health_latencies: List[float] = []
+    done = asyncio.Event()
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+        before = (await client.get("/cache/stats")).json()
+
+        async def worker():
+            while not queue.empty():
+                body = queue.get_nowait()
+                start = time.perf_counter()
+                response = await client.post(args.endpoint, json=body)
+                latencies.append(time.perf_counter() - start)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        # A blocked event loop shows up as /health latency
+        async def probe():
+            while not done.is_set():
+                start = time.perf_counter()
+                await client.get("/health")
+                health_latencies.append(time.perf_counter() - start)
+                await asyncio.sleep(0.05)
+
+        probe_task = asyncio.create_task(probe())
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        wall = time.perf_counter() - start
+        done.set()
+        await probe_task
+
+        after = (await client.get("/cache/stats")).json()
+
+    await main.shutdown()
+    lookups = sum(after[k] - before[k] for k in ("hits", "approximate_hits", "misses"))
+    hits = sum(after[k] - before[k] for k in ("hits", "approximate_hits"))
+    return {
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "wall_seconds": round(wall, 3),
+        "throughput_rps": round(args.requests / wall, 2),
+        "latency_p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "latency_p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "latency_p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "health_max_ms": round(max(health_latencies, default=0.0) * 1000, 1),
+        "cache_hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+        "cache_bytes_per_entry": after["codec"]["bytes_per_entry"],
+        "model_calls": provider.calls,
+        "statuses": statuses,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--endpoint", default="/generate-recipe")
+    parser.add_argument("--hot-ratio", type=float, default=0.8, help="share of requests drawn from the hot set")
+    parser.add_argument("--hot-sets", type=int, default=20, help="number of distinct hot ingredient sets")
+    parser.add_argument("--distribution", default="lognormal", choices=["fixed", "uniform", "lognormal"])
+    parser.add_argument("--latency-mean", type=float, default=2.0)
+    parser.add_argument("--latency-sigma", type=float, default=0.3)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--redis-url", default=None, help="use a real Redis (the db is flushed) instead of fakeredis")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for name, value in report.items():
+            print(f"{name:>16}: {value}")
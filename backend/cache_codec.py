@@ -0,0 +1,277 @@
+"""Binary encoding for cached recipes.
+
+Entry layout, version 1:
+
+    b"RC" | version (1 byte) | compression (1 byte) | dictionary id (4 bytes) | body
+
+The body is the recipe as a positional JSON array, so field names are not repeated
+in every entry, compressed with zstd or zlib and optionally a shared dictionary
+trained on cached recipes (recipes repeat the same cooking vocabulary, which is
+where a dictionary pays off on entries this small). Entries written before this
+format are plain JSON objects and are still read. Train a dictionary or compare
+encodings over what is currently cached with:
+
+    python cache_codec.py train --redis-url redis://localhost:6379/0 --out recipes.dict
+    python cache_codec.py compare --redis-url redis://localhost:6379/0 --dict recipes.dict
+"""
+import json
+import logging
+import struct
+import time
+import zlib
+from typing import Dict, List, Optional
+
+from metrics import CACHE_CODEC_BYTES, CACHE_CODEC_SECONDS
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"RC"
+VERSION = 1
+HEADER = struct.Struct(">2sBBI")
+RAW, ZLIB, ZSTD = 0, 1, 2
+COMPRESSIONS = {"none": RAW, "zlib": ZLIB, "zstd": ZSTD}
+DECODE_ERRORS = (ValueError, struct.error, zlib.error) + ((zstandard.ZstdError,) if zstandard is not None else ())
+
+class CacheCodecError(ValueError):
+    pass
+
+def pack(payload: Dict) -> List:
+    index = payload.get("index") or {}
+    return [
+        payload["cuisine_name"],
+        payload["steps"],
+        payload["suggested_ingredients"],
+        index.get("ingredients"),
+        index.get("context"),
+    ]
+
+def unpack(fields: List) -> Dict:
+    cuisine_name, steps, suggested_ingredients, ingredients, context = fields
+    payload = {"cuisine_name": cuisine_name, "steps": steps, "suggested_ingredients": suggested_ingredients}
+    if ingredients is not None:
+        payload["index"] = {"ingredients": ingredients, "context": context}
+    return payload
+
+class RecipeCodec:
+    """Encodes cache payloads (a recipe plus its ``index`` metadata) to bytes.
+
+    Decoding follows each entry's own header, so entries written under a different
+    ``compression`` setting, or without a dictionary, stay readable. Entries
+    compressed with a different dictionary than the one loaded cannot be, and raise
+    ``CacheCodecError``; callers treat that as a miss. The size of the old plain-JSON
+    format is measured on one write in ``compare_every``, not on the request path of
+    every write, and the totals in ``snapshot`` are estimated from that sample.
+    """
+
+    def __init__(
+        self,
+        compression: str = "zstd",
+        level: int = 3,
+        dictionary: Optional[bytes] = None,
+        compare_every: int = 100
+    ):
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown cache compression: {compression} (expected one of {', '.join(COMPRESSIONS)})")
+        if compression == "zstd" and zstandard is None:
+            logger.warning("zstandard is not installed, compressing the cache with zlib")
+            compression = "zlib"
+        self.compression = compression
+        self.level = level
+        self.dictionary = dictionary
+        self.dict_id = zlib.crc32(dictionary) if dictionary else 0
+        self.compare_every = max(1, compare_every)
+        if zstandard is not None:
+            zstd_dict = zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+            self.zstd_compressor = zstandard.ZstdCompressor(level=level, dict_data=zstd_dict, write_content_size=True)
+            self.zstd_decompressor = zstandard.ZstdDecompressor(dict_data=zstd_dict)
+            self.zstd_plain_decompressor = zstandard.ZstdDecompressor()
+        self.stats = {
+            "encoded": 0,
+            "decoded": 0,
+            "legacy_reads": 0,
+            "unreadable": 0,
+            "encoded_bytes": 0,
+            # Writes also measured as plain JSON, and both sizes for those writes
+            "compared": 0,
+            "compared_json_bytes": 0,
+            "compared_encoded_bytes": 0,
+            "encode_seconds": 0.0,
+            "decode_seconds": 0.0,
+        }
+
+    def compress(self, body: bytes) -> bytes:
+        if self.compression == "zstd":
+            return self.zstd_compressor.compress(body)
+        if self.compression == "zlib":
+            if self.dictionary:
+                compressor = zlib.compressobj(self.level, zdict=self.dictionary)
+                return compressor.compress(body) + compressor.flush()
+            return zlib.compress(body, self.level)
+        return body
+
+    def decompress(self, compression: int, body: bytes, with_dictionary: bool) -> bytes:
+        if compression == ZSTD:
+            if zstandard is None:
+                raise CacheCodecError("Entry is zstd-compressed but zstandard is not installed")
+            decompressor = self.zstd_decompressor if with_dictionary else self.zstd_plain_decompressor
+            return decompressor.decompress(body)
+        if compression == ZLIB:
+            if with_dictionary:
+                decompressor = zlib.decompressobj(zdict=self.dictionary)
+                return decompressor.decompress(body) + decompressor.flush()
+            return zlib.decompress(body)
+        if compression == RAW:
+            return body
+        raise CacheCodecError(f"Unknown compression {compression}")
+
+    def encode(self, payload: Dict) -> bytes:
+        start = time.perf_counter()
+        body = json.dumps(pack(payload), separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+        value = HEADER.pack(MAGIC, VERSION, COMPRESSIONS[self.compression], self.dict_id) + self.compress(body)
+        elapsed = time.perf_counter() - start
+        if self.stats["encoded"] % self.compare_every == 0:
+            # What the same entry costs in the old plain-JSON format; the metric is scaled up to all writes
+            json_bytes = len(json.dumps(payload).encode("utf-8"))
+            self.stats["compared"] += 1
+            self.stats["compared_json_bytes"] += json_bytes
+            self.stats["compared_encoded_bytes"] += len(value)
+            CACHE_CODEC_BYTES.labels("json").inc(json_bytes * self.compare_every)
+        self.stats["encoded"] += 1
+        self.stats["encoded_bytes"] += len(value)
+        self.stats["encode_seconds"] += elapsed
+        CACHE_CODEC_BYTES.labels("encoded").inc(len(value))
+        CACHE_CODEC_SECONDS.labels("encode").inc(elapsed)
+        return value
+
+    def decode(self, value: bytes) -> Dict:
+        start = time.perf_counter()
+        try:
+            if not value.startswith(MAGIC):
+                # Plain JSON entry from before the binary format
+                self.stats["legacy_reads"] += 1
+                return json.loads(value)
+            _, version, compression, dict_id = HEADER.unpack_from(value)
+            if version != VERSION:
+                raise CacheCodecError(f"Unsupported cache entry version {version}")
+            if dict_id and dict_id != self.dict_id:
+                raise CacheCodecError(f"Cache entry needs dictionary {dict_id:08x}, loaded {self.dict_id:08x}")
+            return unpack(json.loads(self.decompress(compression, value[HEADER.size:], bool(dict_id))))
+        except DECODE_ERRORS as e:
+            self.stats["unreadable"] += 1
+            if isinstance(e, CacheCodecError):
+                raise
+            raise CacheCodecError(str(e)) from e
+        finally:
+            elapsed = time.perf_counter() - start
+            self.stats["decoded"] += 1
+            self.stats["decode_seconds"] += elapsed
+            CACHE_CODEC_SECONDS.labels("decode").inc(elapsed)
+
+    def snapshot(self) -> Dict:
+        stats = self.stats
+        ratio = stats["compared_encoded_bytes"] / stats["compared_json_bytes"] if stats["compared_json_bytes"] else None
+        json_bytes = round(stats["encoded_bytes"] / ratio) if ratio else None
+        return {
+            "compression": self.compression,
+            "level": self.level,
+            "dictionary_id": f"{self.dict_id:08x}" if self.dict_id else None,
+            **stats,
+            "json_bytes_estimated": json_bytes,
+            "bytes_saved_estimated": json_bytes - stats["encoded_bytes"] if json_bytes is not None else None,
+            "ratio": ratio,
+            "bytes_per_entry": stats["encoded_bytes"] / stats["encoded"] if stats["encoded"] else None,
+            "encode_us_avg": stats["encode_seconds"] / stats["encoded"] * 1e6 if stats["encoded"] else None,
+            "decode_us_avg": stats["decode_seconds"] / stats["decoded"] * 1e6 if stats["decoded"] else None,
+        }
+
+def load_dictionary(path: Optional[str]) -> Optional[bytes]:
+    if not path:
+        return None
+    with open(path, "rb") as f:
+        return f.read()
+
+def train_dictionary(samples: List[bytes], size: int) -> bytes:
+    if zstandard is not None and len(samples) >= 100:
+        try:
+            return zstandard.train_dictionary(size, samples).as_bytes()
+        except zstandard.ZstdError as e:
+            logger.warning(f"zstd dictionary training failed ({str(e)}), using a raw content dictionary")
+    # Raw content dictionary, also usable as a zlib zdict: the most recent samples matter most to zlib
+    return b"".join(samples)[-size:]
+
+async def sample_entries(redis_url: str, pattern: str, limit: int) -> List[Dict]:
+    import redis.asyncio as redis
+
+    client = redis.from_url(redis_url)
+    codec = RecipeCodec("none")
+    payloads = []
+    try:
+        async for key in client.scan_iter(match=pattern, count=500):
+            value = await client.get(key)
+            if value:
+                try:
+                    payloads.append(codec.decode(value))
+                except CacheCodecError:
+                    continue
+            if len(payloads) >= limit:
+                break
+    finally:
+        await client.close()
+    return payloads
+
+def compare(payloads: List[Dict], dictionary: Optional[bytes], level: int):
+    configurations = [("json", None, None)]
+    for compression in ("none", "zlib", "zstd"):
+        configurations.append((compression, compression, None))
+        if dictionary and compression != "none":
+            configurations.append((f"{compression}+dict", compression, dictionary))
+    baseline = sum(len(json.dumps(payload).encode("utf-8")) for payload in payloads)
+    print(f"{len(payloads)} entries, {baseline / len(payloads):.0f} bytes each as plain JSON")
+    print(f"{'encoding':>10} {'bytes/entry':>11} {'ratio':>6} {'per GB':>10} {'encode us':>9} {'decode us':>9}")
+    for name, compression, dict_data in configurations:
+        if compression is None:
+            size, encode_us, decode_us = baseline, 0.0, 0.0
+        else:
+            codec = RecipeCodec(compression, level, dict_data)
+            values = [codec.encode(payload) for payload in payloads]
+            for value in values:
+                codec.decode(value)
+            stats = codec.snapshot()
+            size, encode_us, decode_us = stats["encoded_bytes"], stats["encode_us_avg"], stats["decode_us_avg"]
+        per_entry = size / len(payloads)
+        print(
+            f"{name:>10} {per_entry:>11.0f} {size / baseline:>6.2f} {int(2 ** 30 / per_entry):>10} "
+            f"{encode_us:>9.1f} {decode_us:>9.1f}"
+        )
+
+if __name__ == "__main__":
+    import argparse
+    import asyncio
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("command", choices=["train", "compare"])
+    parser.add_argument("--redis-url", default="redis://localhost:6379/0")
+    parser.add_argument("--pattern", default="recipe:*")
+    parser.add_argument("--samples", type=int, default=2000, help="entries to sample from Redis")
+    parser.add_argument("--size", type=int, default=16384, help="dictionary size in bytes")
+    parser.add_argument("--level", type=int, default=3)
+    parser.add_argument("--dict", default=None, help="dictionary to compare with")
+    parser.add_argument("--out", default="recipes.dict")
+    args = parser.parse_args()
+
+    payloads = asyncio.run(sample_entries(args.redis_url, args.pattern, args.samples))
+    if not payloads:
+        raise SystemExit(f"No readable entries match {args.pattern}")
+    if args.command == "train":
+        samples = [json.dumps(pack(payload), separators=(",", ":"), ensure_ascii=False).encode("utf-8") for payload in payloads]
+        dictionary = train_dictionary(samples, args.size)
+        with open(args.out, "wb") as f:
+            f.write(dictionary)
+        print(f"Wrote {len(dictionary)} byte dictionary {zlib.crc32(dictionary):08x} to {args.out}")
+    else:
+        compare(payloads, load_dictionary(args.dict), args.level)
@@ -0,0 +1,245 @@
+"""Canonical cache keys for recipe requests.
+
+Ingredients are trimmed, case-folded, singularized, mapped through an alias table
+and deduplicated before hashing, so "Tomato", "tomatoes " and "tomato" share an
+entry. Compare hit rates of the old and new keys over recorded requests with:
+
+    python cache_keys.py traffic.jsonl
+
+and check the normalization table below with ``python cache_keys.py --check``.
+"""
+import hashlib
+import json
+import os
+import re
+import sys
+import unicodedata
+from typing import Dict, Iterable, List, Optional
+
+# Bump to invalidate every cached recipe when normalization rules change
+KEY_VERSION = "1"
+RECIPE_ID_PATTERN = re.compile(r"[0-9a-f]{32}")
+
+# Canonical name for common synonyms, regional and Hindi names (applied after singularizing)
+INGREDIENT_ALIASES: Dict[str, str] = {
+    "cilantro": "coriander",
+    "coriander leaf": "coriander",
+    "cilantro leaf": "coriander",
+    "dhania": "coriander",
+    "scallion": "green onion",
+    "spring onion": "green onion",
+    "capsicum": "bell pepper",
+    "shimla mirch": "bell pepper",
+    "aubergine": "eggplant",
+    "brinjal": "eggplant",
+    "baingan": "eggplant",
+    "courgette": "zucchini",
+    "garbanzo": "chickpea",
+    "garbanzo bean": "chickpea",
+    "chana": "chickpea",
+    "prawn": "shrimp",
+    "curd": "yogurt",
+    "dahi": "yogurt",
+    "yoghurt": "yogurt",
+    "maize": "corn",
+    "bhindi": "okra",
+    "lady finger": "okra",
+    "ladies finger": "okra",
+    "aloo": "potato",
+    "gobi": "cauliflower",
+    "jeera": "cumin",
+    "haldi": "turmeric",
+    "chilli": "chili",
+    "chile": "chili",
+    "green chilli": "green chili",
+    "red chilli": "red chili",
+    "rocket": "arugula",
+    "mince": "ground meat",
+}
+
+# Plurals the suffix rules below would get wrong
+IRREGULAR_PLURALS: Dict[str, str] = {
+    "leaves": "leaf",
+    "halves": "half",
+    "loaves": "loaf",
+    "knives": "knife",
+    "cookies": "cookie",
+    "brownies": "brownie",
+    "veggies": "veggie",
+    "smoothies": "smoothie",
+    "ladies": "lady",
+    # Not "chilly"/"chily", which would miss the chili aliases
+    "chillies": "chili",
+    "chilies": "chili",
+}
+
+# Words that end in "s" but are not plurals
+UNCOUNTABLE = {
+    "asparagus", "couscous", "hummus", "molasses", "swiss", "citrus",
+    "hibiscus", "octopus", "bass", "grass", "cress",
+}
+
+# Spellings that must share a key: (as typed, canonical)
+NORMALIZATION_CASES = [
+    ("Tomatoes ", "tomato"),
+    ("cherry tomatoes", "cherry tomato"),
+    ("potatoes", "potato"),
+    ("Spring Onions", "green onion"),
+    ("scallions", "green onion"),
+    ("green chillies", "green chili"),
+    ("green chilies", "green chili"),
+    ("green chilli", "green chili"),
+    ("red chillies", "red chili"),
+    ("chillies", "chili"),
+    ("chilies", "chili"),
+    ("chiles", "chili"),
+    ("chilli", "chili"),
+    ("cilantro", "coriander"),
+    ("cilantro leaves", "coriander"),
+    ("coriander leaves", "coriander"),
+    ("dhania", "coriander"),
+    ("curry leaves", "curry leaf"),
+    ("aubergines", "eggplant"),
+    ("brinjal", "eggplant"),
+    ("chickpeas", "chickpea"),
+    ("garbanzo beans", "chickpea"),
+    ("berries", "berry"),
+    ("peaches", "peach"),
+    ("asparagus", "asparagus"),
+    ("hummus", "hummus"),
+]
+
+def _load_extra_aliases() -> Dict[str, str]:
+    path = os.getenv('INGREDIENT_ALIASES_FILE')
+    if not path:
+        return {}
+    with open(path) as f:
+        return {normalize_text(k): normalize_text(v) for k, v in json.load(f).items()}
+
+def normalize_text(text: str) -> str:
+    text = unicodedata.normalize("NFKC", text).casefold()
+    text = re.sub(r"[^\w\s-]", " ", text)
+    return " ".join(text.split())
+
+def singularize(word: str) -> str:
+    if word in IRREGULAR_PLURALS:
+        return IRREGULAR_PLURALS[word]
+    if word in UNCOUNTABLE or len(word) <= 3:
+        return word
+    if word.endswith("ies") and len(word) > 4:
+        return word[:-3] + "y"
+    if word.endswith("oes"):
+        return word[:-2]
+    if word.endswith(("ches", "shes", "sses", "xes", "zes")):
+        return word[:-2]
+    if word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        return word[:-1]
+    return word
+
+def normalize_ingredient(ingredient: str) -> str:
+    text = normalize_text(ingredient)
+    if not text:
+        return ""
+    # Only the head noun of a phrase is pluralized ("green onions", "cherry tomatoes")
+    words = text.split(" ")
+    words[-1] = singularize(words[-1])
+    text = " ".join(words)
+    return INGREDIENT_ALIASES.get(text, text)
+
+def normalize_ingredients(ingredients: Iterable[str]) -> List[str]:
+    return sorted({name for name in (normalize_ingredient(i) for i in ingredients) if name})
+
+def recipe_cache_key(
+    ingredients: Iterable[str],
+    cuisine_type: Optional[str] = None,
+    dietary_restrictions: Optional[Iterable[str]] = None,
+) -> str:
+    canonical = json.dumps([
+        KEY_VERSION,
+        normalize_ingredients(ingredients),
+        normalize_text(cuisine_type or "") or "any",
+        sorted({normalize_text(d) for d in dietary_restrictions or [] if normalize_text(d)}),
+    ], separators=(",", ":"))
+    # Fixed-size key regardless of how long the ingredient list is
+    return f"recipe:{hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:32]}"
+
+def recipe_content_id(cuisine_name: str, steps: List[str], suggested_ingredients: List[str]) -> str:
+    # Content address: the same recipe always gets the same id, so anything served by id never changes
+    canonical = json.dumps([cuisine_name, steps, suggested_ingredients], separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:32]
+
+def recipe_id_key(content_id: str) -> str:
+    # Deliberately outside "recipe:*", which is scanned as the request cache
+    return f"recipe-id:{content_id}"
+
+def recipe_context(cuisine_type: Optional[str] = None, dietary_restrictions: Optional[Iterable[str]] = None) -> str:
+    # Everything besides the ingredients that a cached recipe was generated under
+    cuisine = normalize_text(cuisine_type or "") or "any"
+    restrictions = sorted({normalize_text(d) for d in dietary_restrictions or [] if normalize_text(d)})
+    return "|".join([cuisine, *restrictions])
+
+def legacy_cache_key(ingredients: List[str], cuisine_type: Optional[str] = None) -> str:
+    return f"recipe:{':'.join(sorted(ingredients))}:{cuisine_type or 'any'}"
+
+def compare_hit_rates(requests: Iterable[Dict]) -> Dict[str, Dict[str, float]]:
+    # Replays requests against an unbounded cache; TTL expiry is ignored
+    seen = {"legacy": set(), "normalized": set()}
+    hits = {"legacy": 0, "normalized": 0}
+    total = 0
+    for request in requests:
+        total += 1
+        keys = {
+            "legacy": legacy_cache_key(request.get("ingredients", []), request.get("cuisine_type")),
+            "normalized": recipe_cache_key(
+                request.get("ingredients", []),
+                request.get("cuisine_type"),
+                request.get("dietary_restrictions"),
+            ),
+        }
+        for name, key in keys.items():
+            if key in seen[name]:
+                hits[name] += 1
+            seen[name].add(key)
+    return {
+        name: {
+            "requests": total,
+            "hits": hits[name],
+            "hit_rate": hits[name] / total if total else 0.0,
+            "distinct_keys": len(seen[name]),
+        }
+        for name in seen
+    }
+
+def capture_requests(records: Iterable[Dict]) -> Iterable[Dict]:
+    # Bare RecipeRequest bodies, or capture.py records whose "request" is one body or a batch of them
+    for record in records:
+        request = record.get("request", record)
+        if not isinstance(request, dict):
+            continue
+        if "requests" in request:
+            yield from request["requests"]
+        else:
+            yield request
+
+INGREDIENT_ALIASES.update(_load_extra_aliases())
+
+def check_normalization() -> bool:
+    failures = 0
+    for typed, expected in NORMALIZATION_CASES:
+        got = normalize_ingredient(typed)
+        failures += got != expected
+        print(f"{'ok' if got == expected else 'FAIL':>4}  {typed!r:<22} -> {got!r}" + ("" if got == expected else f" (expected {expected!r})"))
+    print(f"\n{len(NORMALIZATION_CASES) - failures}/{len(NORMALIZATION_CASES)} cases pass")
+    return failures == 0
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("usage: python cache_keys.py <requests.jsonl> | --check")
+        sys.exit(1)
+    if sys.argv[1] == "--check":
+        sys.exit(0 if check_normalization() else 1)
+    with open(sys.argv[1]) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    stats = compare_hit_rates(capture_requests(records))
+    for name, s in stats.items():
+        print(f"{name:>10}: {s['hits']}/{s['requests']} hits ({s['hit_rate']:.1%}), {s['distinct_keys']} distinct keys")
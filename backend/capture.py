@@ -0,0 +1,172 @@
+"""Sampled traffic capture to an append-only JSONL file.
+
+Enabled by setting ``TRAFFIC_CAPTURE_FILE``. A sampled request adds one dict to an
+in-memory buffer; a background task serializes and appends the buffer on a worker
+thread every ``flush_interval``, so the request path never touches the disk. When
+the buffer is full, records are dropped and counted rather than held. Each line is
+
+    {"ts": ..., "endpoint": ..., "request": {...}, "status": 200, "latency_ms": ...,
+     "cache": "hit", "stages": {"cache_lookup": 0.4, ...}}
+
+which ``replay.py`` plays back and ``cache_keys.py`` reads (batches item by item).
+Streamed responses are recorded once their body has been sent.
+"""
+import asyncio
+import functools
+import json
+import logging
+import os
+import random
+import time
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+from metrics import TRAFFIC_CAPTURE_RECORDS, request_timings
+
+logger = logging.getLogger(__name__)
+
+# The record for the request being handled, if it was sampled
+capture_record: ContextVar[Optional[Dict]] = ContextVar("capture_record", default=None)
+
+def note_cache_outcome(outcome, **details):
+    # hit, stale, similar or miss for single requests; counts for batches
+    record = capture_record.get()
+    if record is not None:
+        record["cache"] = outcome
+        record.update(details)
+
+class TrafficCapture:
+    def __init__(
+        self,
+        path: str,
+        sample_rate: float = 0.1,
+        max_buffer: int = 10000,
+        flush_interval: float = 1.0,
+        max_bytes: int = 256 * 1024 * 1024
+    ):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.max_buffer = max_buffer
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.buffer: List[Dict] = []
+        self.rng = random.Random()
+        self.stats = {"sampled": 0, "written": 0, "dropped": 0, "bytes": 0, "rotations": 0}
+
+    def sampled(self) -> bool:
+        return self.rng.random() < self.sample_rate
+
+    def record(self, record: Dict):
+        if len(self.buffer) >= self.max_buffer:
+            self.stats["dropped"] += 1
+            TRAFFIC_CAPTURE_RECORDS.labels("dropped").inc()
+            return
+        self.stats["sampled"] += 1
+        self.buffer.append(record)
+
+    def write(self, records: List[Dict]) -> int:
+        # Runs on a worker thread
+        data = "".join(json.dumps(record, separators=(",", ":"), ensure_ascii=False) + "\n" for record in records)
+        if os.path.exists(self.path) and os.path.getsize(self.path) + len(data) > self.max_bytes:
+            # Keep one previous file; a capture is a sample, not an audit log
+            os.replace(self.path, f"{self.path}.1")
+            self.stats["rotations"] += 1
+        # One O_APPEND write per flush, so flushes from several worker processes never interleave mid-line
+        encoded = data.encode("utf-8")
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, encoded)
+        finally:
+            os.close(fd)
+        return len(encoded)
+
+    async def flush(self):
+        if not self.buffer:
+            return
+        records, self.buffer = self.buffer, []
+        try:
+            written = await asyncio.get_running_loop().run_in_executor(None, self.write, records)
+        except OSError as e:
+            self.stats["dropped"] += len(records)
+            TRAFFIC_CAPTURE_RECORDS.labels("dropped").inc(len(records))
+            logger.error(f"Failed to write traffic capture to {self.path}: {str(e)}")
+            return
+        self.stats["written"] += len(records)
+        self.stats["bytes"] += written
+        TRAFFIC_CAPTURE_RECORDS.labels("written").inc(len(records))
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def captured(self, endpoint: str, argument: str):
+        """Decorator recording the endpoint's ``argument`` (a pydantic model) as the request."""
+        def decorator(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                if not self.sampled():
+                    return await func(*args, **kwargs)
+                body = kwargs.get(argument)
+                record = {
+                    "ts": round(time.time(), 3),
+                    "endpoint": endpoint,
+                    "sample_rate": self.sample_rate,
+                    "request": body.model_dump(exclude_none=True) if hasattr(body, "model_dump") else None,
+                    "cache": None,
+                }
+                timings = request_timings.get()
+                timings_token = None
+                if timings is None:
+                    timings = {}
+                    timings_token = request_timings.set(timings)
+                record_token = capture_record.set(record)
+                status = 200
+                streamed = False
+                start = time.perf_counter()
+                try:
+                    response = await func(*args, **kwargs)
+                    if isinstance(response, StreamingResponse):
+                        # The handler returns before the body runs; record once it has been sent
+                        response.body_iterator = self._record_after(response.body_iterator, record, start, timings)
+                        streamed = True
+                    return response
+                except HTTPException as e:
+                    status = e.status_code
+                    raise
+                except Exception:
+                    status = 500
+                    raise
+                finally:
+                    capture_record.reset(record_token)
+                    if timings_token is not None:
+                        request_timings.reset(timings_token)
+                    if not streamed:
+                        self._finish(record, status, start, timings)
+            return wrapper
+        return decorator
+
+    async def _record_after(self, body, record: Dict, start: float, timings: Dict[str, float]):
+        # Runs in the task sending the body, so stages timed while streaming are recorded too
+        request_timings.set(timings)
+        status = 200
+        try:
+            async for chunk in body:
+                yield chunk
+        except Exception:
+            status = 500
+            raise
+        finally:
+            self._finish(record, status, start, timings)
+
+    def _finish(self, record: Dict, status: int, start: float, timings: Dict[str, float]):
+        record["status"] = status
+        record["latency_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        record["stages"] = {name: round(seconds * 1000, 2) for name, seconds in timings.items()}
+        self.record(record)
+
+    def snapshot(self) -> Dict:
+        return {"path": self.path, "sample_rate": self.sample_rate, "buffered": len(self.buffer), **self.stats}
@@ -0,0 +1,75 @@
+import logging
+import time
+from typing import Dict, Optional
+
+from metrics import DEPENDENCY_ERRORS, DEPENDENCY_STATE
+
+logger = logging.getLogger(__name__)
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+class CircuitBreaker:
+    """Stops calling a dependency that keeps failing.
+
+    After ``failure_threshold`` consecutive failures the circuit opens and
+    ``allow`` returns False for ``reset_timeout`` seconds, so callers skip the
+    dependency instead of waiting on timeouts. Then a single probe call is let
+    through (half-open): success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 10.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        self.probe_started = 0.0
+        self.last_error: Optional[str] = None
+        DEPENDENCY_STATE.labels(name).set(STATE_VALUES[CLOSED])
+
+    def _set_state(self, state: str):
+        if state != self.state:
+            log = logger.info if state == CLOSED else logger.warning
+            log(f"{self.name} circuit {self.state} -> {state}")
+            self.state = state
+            DEPENDENCY_STATE.labels(self.name).set(STATE_VALUES[state])
+
+    def allow(self) -> bool:
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self._set_state(HALF_OPEN)
+        # A probe that never reported back (e.g. cancelled) stops blocking after reset_timeout
+        if self.state == HALF_OPEN and (not self.probing or time.monotonic() - self.probe_started >= self.reset_timeout):
+            self.probing = True
+            self.probe_started = time.monotonic()
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.probing = False
+        self._set_state(CLOSED)
+
+    def record_failure(self, error: Exception, operation: str = "call"):
+        self.failures += 1
+        self.probing = False
+        self.last_error = f"{type(error).__name__}: {error}"
+        DEPENDENCY_ERRORS.labels(self.name, operation).inc()
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            self._set_state(OPEN)
+
+    @property
+    def available(self) -> bool:
+        return self.state != OPEN
+
+    def snapshot(self) -> Dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "last_error": self.last_error,
+        }
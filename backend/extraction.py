@@ -0,0 +1,342 @@
+"""Recipe extraction from raw model generations.
+
+``extract_json`` finds the first JSON object in the text in one left-to-right
+scan, repairing the defects Llama actually produces along the way: ``//`` and
+``/* */`` comments (the prompt shows them), trailing commas, missing commas between
+items, raw newlines inside strings and output cut off at ``max_gen_len``. A
+truncated object is completed by dropping the partial tail and closing whatever is
+still open. Check it against the corpus of model outputs with:
+
+    python extraction.py extraction_corpus.jsonl
+"""
+import json
+import re
+import time
+from typing import Dict, List, Optional, Tuple
+
+from pydantic import ValidationError
+
+WHITESPACE = re.compile(r'[ \t\r\n]*')
+# Run of string characters that need no special handling
+STRING_RUN = re.compile(r'[^"\\\x00-\x1f]*')
+CONTROL_ESCAPES = {'\n': '\\n', '\r': '\\r', '\t': '\\t'}
+
+class ExtractionError(ValueError):
+    def __init__(self, reason: str, message: str, truncated: bool = False):
+        super().__init__(message)
+        # Short label for metrics: no_json, invalid_json, invalid_schema or truncated
+        self.reason = reason
+        self.truncated = truncated
+
+class Frame:
+    """An open object or array.
+
+    ``state`` is what the scanner expects next: ``key``, ``colon``, ``value`` or
+    ``comma`` (arrays only use ``value`` and ``comma``).
+    """
+
+    __slots__ = ("kind", "state", "key_start")
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.state = "key" if kind == '{' else "value"
+        # Offset in the output where the current member's key starts
+        self.key_start = 0
+
+def _drop_string(out: List[str]):
+    # Remove the complete string at the end of ``out``; a lone '"' chunk is always a delimiter
+    out.pop()
+    while out and out[-1] != '"':
+        out.pop()
+    if out:
+        out.pop()
+
+def _complete(out: List[str], stack: List[Frame], string_start: Optional[int]) -> List[str]:
+    # Close a generation cut off at max_gen_len, dropping whatever is half-written
+    repairs = ["truncated"]
+    frame = stack[-1]
+    if string_start is not None:
+        if frame.kind == '{' and frame.state == "key":
+            del out[frame.key_start:]
+        elif frame.kind == '[':
+            # A half-written step reads worse than a missing one
+            del out[string_start:]
+            repairs.append("dropped_partial_item")
+        else:
+            out.append('"')
+            frame.state = "comma"
+    if out[-1] not in '"}]{[,:':
+        # Literal at the very end that may be partial, e.g. "tru" or "12."; earlier ones ended at a delimiter
+        while out[-1] not in '"}]{[,:':
+            out.pop()
+    while True:
+        # Every branch shortens the output or stops, so this ends; the check guards against a branch that does not
+        length = len(out)
+        last = out[-1]
+        if last == ',':
+            out.pop()
+        elif last == ':':
+            out.pop()
+            if frame.kind == '{':
+                # Key without a value
+                _drop_string(out)
+            frame.state = "comma"
+        elif frame.kind == '{' and frame.state == "colon":
+            # Key without even a colon
+            _drop_string(out)
+            frame.state = "comma"
+        else:
+            break
+        if len(out) >= length:
+            raise ExtractionError("truncated", "Could not complete truncated model response", truncated=True)
+    for frame in reversed(stack):
+        out.append('}' if frame.kind == '{' else ']')
+    return repairs
+
+def extract_json(text: str) -> Tuple[Dict, List[str]]:
+    """Return the first JSON object in ``text`` and the repairs applied to it.
+
+    A candidate that turns out to be prose (a ``{`` not followed by a quoted key)
+    is abandoned where it fails and the search resumes from that point, so the
+    text is read once. Raises ``ExtractionError``.
+    """
+    n = len(text)
+    out: List[str] = []
+    stack: List[Frame] = []
+    repairs: List[str] = []
+    string_start: Optional[int] = None
+    i = 0
+    while i < n:
+        if not stack:
+            i = text.find('{', i)
+            if i < 0:
+                break
+            out, repairs = ['{'], []
+            stack.append(Frame('{'))
+            i += 1
+            continue
+        frame = stack[-1]
+
+        if string_start is not None:
+            run = STRING_RUN.match(text, i).end()
+            if run > i:
+                out.append(text[i:run])
+                i = run
+            if i >= n:
+                break
+            ch = text[i]
+            if ch == '"':
+                out.append('"')
+                string_start = None
+                frame.state = "colon" if frame.state == "key" else "comma"
+                i += 1
+            elif ch == '\\':
+                if i + 1 >= n:
+                    break
+                out.append(text[i:i + 2])
+                i += 2
+            else:
+                # Raw control character inside a string
+                out.append(CONTROL_ESCAPES.get(ch, f"\\u{ord(ch):04x}"))
+                repairs.append("control_char")
+                i += 1
+            continue
+
+        i = WHITESPACE.match(text, i).end()
+        if i >= n:
+            break
+        ch = text[i]
+
+        if text.startswith('//', i):
+            end = text.find('\n', i)
+            i = n if end < 0 else end
+            repairs.append("comment")
+            continue
+        if text.startswith('/*', i):
+            end = text.find('*/', i + 2)
+            i = n if end < 0 else end + 2
+            repairs.append("comment")
+            continue
+
+        if frame.kind == '{' and (
+            (frame.state == "key" and ch not in '"}') or (frame.state == "colon" and ch != ':')
+        ):
+            # Not an object after all (prose like "{your} recipe"); look for the next one from here
+            stack.clear()
+            continue
+
+        if ch in '}]':
+            if out[-1] == ',':
+                out.pop()
+                repairs.append("trailing_comma")
+            closer = '}' if frame.kind == '{' else ']'
+            stack.pop()
+            out.append(closer)
+            if ch != closer:
+                # Wrong bracket type; close what is actually open
+                repairs.append("mismatched_bracket")
+            i += 1
+            if not stack:
+                try:
+                    return json.loads(''.join(out)), repairs
+                except ValueError as e:
+                    raise ExtractionError("invalid_json", f"Invalid JSON in model response: {e}")
+            stack[-1].state = "comma"
+            continue
+        if ch == ',':
+            out.append(',')
+            frame.state = "key" if frame.kind == '{' else "value"
+            i += 1
+            continue
+        if ch == ':':
+            out.append(':')
+            frame.state = "value"
+            i += 1
+            continue
+
+        if frame.state == "comma" and (ch == '"' or frame.kind == '['):
+            # Two items back to back: the model forgot a comma
+            out.append(',')
+            repairs.append("missing_comma")
+            frame.state = "key" if frame.kind == '{' else "value"
+        if ch == '"':
+            if frame.state == "key":
+                frame.key_start = len(out)
+            string_start = len(out)
+            out.append('"')
+        elif ch in '{[':
+            out.append(ch)
+            stack.append(Frame(ch))
+        else:
+            # Literal character (number, true, false, null); literals end at the next delimiter
+            j = i + 1
+            while j < n and text[j] not in ',:{}[]"/ \t\r\n':
+                j += 1
+            out.append(text[i:j])
+            frame.state = "comma"
+            i = j
+            continue
+        i += 1
+
+    if not stack:
+        raise ExtractionError("no_json", "No JSON object in model response")
+    repairs.extend(_complete(out, stack, string_start))
+    try:
+        return json.loads(''.join(out)), repairs
+    except ValueError as e:
+        raise ExtractionError("truncated", f"Could not complete truncated model response: {e}", truncated=True)
+
+def extract_recipe(text: str, schema) -> Tuple[Dict, List[str]]:
+    """Extract a recipe and validate it against ``schema`` (a pydantic model)."""
+    recipe, repairs = extract_json(text)
+    truncated = "truncated" in repairs
+    if not isinstance(recipe, dict):
+        raise ExtractionError("invalid_schema", "Model response is not a JSON object")
+    if truncated:
+        if not recipe.get("steps") or not recipe.get("cuisine_name"):
+            raise ExtractionError("truncated", "Model response was cut off before the recipe", truncated=True)
+        if "suggested_ingredients" not in recipe:
+            # The suggestions come last and are the cheapest part to lose
+            recipe["suggested_ingredients"] = []
+            repairs.append("default_suggestions")
+    try:
+        schema(**recipe)
+    except (TypeError, ValidationError) as e:
+        raise ExtractionError("invalid_schema", f"Recipe does not match the response schema: {e}", truncated)
+    return recipe, repairs
+
+def legacy_extract(text: str, schema) -> Dict:
+    # The greedy regex this module replaced, kept for the corpus comparison
+    match = re.search(r'\{[\s\S]*\}', text)
+    if not match:
+        raise ExtractionError("no_json", "No JSON object in model response")
+    recipe = json.loads(match.group(0))
+    schema(**recipe)
+    return recipe
+
+def check_case(case: Dict, recipe: Optional[Dict], error: Optional[ExtractionError]) -> Optional[str]:
+    expected_error = case.get("expect_error")
+    if expected_error:
+        if error is None:
+            return f"expected {expected_error}, got a recipe"
+        if error.reason != expected_error:
+            return f"expected {expected_error}, got {error.reason}: {error}"
+        return None
+    if error is not None:
+        return f"{error.reason}: {error}"
+    expect = case.get("expect", {})
+    if "cuisine_name" in expect and recipe["cuisine_name"] != expect["cuisine_name"]:
+        return f"cuisine_name {recipe['cuisine_name']!r} != {expect['cuisine_name']!r}"
+    for field in ("steps", "suggested_ingredients"):
+        if field in expect and len(recipe[field]) != expect[field]:
+            return f"{len(recipe[field])} {field} != {expect[field]}"
+    return None
+
+def run_corpus(path: str, repeat: int) -> bool:
+    # Imported here so the extractor itself does not depend on the app
+    from main import RecipeResponse
+
+    with open(path, encoding="utf-8") as f:
+        cases = [json.loads(line) for line in f if line.strip()]
+
+    failures = 0
+    extracted_ok = 0
+    legacy_ok = 0
+    for case in cases:
+        recipe, error = None, None
+        try:
+            recipe, repairs = extract_recipe(case["text"], RecipeResponse)
+        except ExtractionError as e:
+            error, repairs = e, []
+        problem = check_case(case, recipe, error)
+        try:
+            legacy_extract(case["text"], RecipeResponse)
+            legacy_ok += not case.get("expect_error")
+        except (ValueError, TypeError, ValidationError):
+            pass
+        failures += problem is not None
+        extracted_ok += recipe is not None and problem is None
+        status = "FAIL" if problem else "ok"
+        detail = problem or ", ".join(sorted(set(repairs))) or "-"
+        print(f"{status:>4}  {case['name']:<36} {detail}")
+
+    # Every prefix of every case is a possible cut-off at max_gen_len: each must give a recipe or an ExtractionError
+    prefixes = 0
+    for case in cases:
+        for end in range(len(case["text"])):
+            prefixes += 1
+            try:
+                extract_recipe(case["text"][:end], RecipeResponse)
+            except ExtractionError:
+                pass
+            except Exception as e:
+                failures += 1
+                print(f"FAIL  {case['name']:<36} cut at {end}: {type(e).__name__}: {e}")
+
+    texts = [case["text"] for case in cases]
+    timings = {}
+    for name, fn in (("extractor", extract_recipe), ("legacy", legacy_extract)):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for text in texts:
+                try:
+                    fn(text, RecipeResponse)
+                except (ValueError, TypeError, ValidationError):
+                    pass
+        timings[name] = (time.perf_counter() - start) / (repeat * len(texts)) * 1e6
+
+    parseable = sum(1 for case in cases if not case.get("expect_error"))
+    print(f"\n{len(cases) - failures}/{len(cases)} cases pass, {prefixes} truncated prefixes checked")
+    print(f"recipes recovered: extractor {extracted_ok}/{parseable}, legacy regex {legacy_ok}/{parseable}")
+    print(f"mean time per response: extractor {timings['extractor']:.1f} us, legacy regex {timings['legacy']:.1f} us")
+    return failures == 0
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("corpus", nargs="?", default="extraction_corpus.jsonl")
+    parser.add_argument("--repeat", type=int, default=200, help="timing iterations over the corpus")
+    args = parser.parse_args()
+    sys.exit(0 if run_corpus(args.corpus, args.repeat) else 1)
@@ -0,0 +1,180 @@
+"""Weighted fair queueing of model work between clients.
+
+Clients are identified by API key (``X-API-Key``) or, failing that, IP address.
+``FairScheduler`` runs at most ``capacity()`` generations at once; when it is
+full, waiters are served by start-time fair queueing. A request starts at
+``max(virtual_time, finish of the client's previous request)`` and finishes
+``1 / weight`` later; the waiter with the earliest start goes next. A client with
+weight 2 thus gets twice the share of a client with weight 1 while both are
+backlogged, and a client sending one request now and then is served ahead of a
+client with hundreds queued.
+"""
+import asyncio
+import hashlib
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Tuple
+
+from admission import AdmissionRejected
+from metrics import FAIR_QUEUE_DEPTH, FAIR_QUEUE_REJECTIONS, FAIR_QUEUE_WAIT_SECONDS
+
+# Background work (refreshes, warming) queues as this client
+INTERNAL_CLIENT = ("internal", 1.0)
+
+# (client id, weight) of the request being handled
+current_client: ContextVar[Tuple[str, float]] = ContextVar("current_client", default=INTERNAL_CLIENT)
+
+def parse_weights(spec: str) -> Dict[str, float]:
+    # "api-key-1=4,10.0.0.7=0.5"
+    weights = {}
+    for item in spec.split(","):
+        if item.strip():
+            client, _, weight = item.strip().rpartition("=")
+            weights[client] = float(weight)
+    return weights
+
+class ClientIdentityMiddleware:
+    """Sets ``current_client`` for each HTTP request (pure ASGI, no extra task)."""
+
+    def __init__(self, app, weights: Optional[Dict[str, float]] = None, default_weight: float = 1.0, trust_forwarded_for: bool = False):
+        self.app = app
+        self.weights = weights or {}
+        self.default_weight = default_weight
+        self.trust_forwarded_for = trust_forwarded_for
+
+    def identify(self, scope) -> Tuple[str, float]:
+        headers = dict(scope.get("headers") or [])
+        api_key = headers.get(b"x-api-key", b"").decode("latin-1").strip()
+        if api_key:
+            # Keys never show up in stats or logs, only a short digest
+            return f"key:{hashlib.sha256(api_key.encode()).hexdigest()[:12]}", self.weights.get(api_key, self.default_weight)
+        forwarded = headers.get(b"x-forwarded-for", b"").decode("latin-1")
+        if self.trust_forwarded_for and forwarded:
+            ip = forwarded.split(",")[0].strip()
+        else:
+            ip = (scope.get("client") or ("unknown", 0))[0]
+        return f"ip:{ip}", self.weights.get(ip, self.default_weight)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = current_client.set(self.identify(scope))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_client.reset(token)
+
+class FairScheduler:
+    def __init__(
+        self,
+        capacity: Callable[[], int],
+        max_queue_per_client: int = 50,
+        queue_timeout: float = 10.0,
+        idle_clients: int = 10000
+    ):
+        self.capacity = capacity
+        self.max_queue_per_client = max_queue_per_client
+        self.queue_timeout = queue_timeout
+        self.idle_clients = idle_clients
+        self.active = 0
+        self.virtual_time = 0.0
+        # client -> virtual finish of its most recent request
+        self.last_finish: Dict[str, float] = {}
+        self.queued: Dict[str, int] = {}
+        self.heap: List[Tuple[float, int, str, asyncio.Future]] = []
+        self.sequence = itertools.count()
+        self.served: Dict[str, int] = {}
+        self.rejected = 0
+
+    def _start(self, client: str, weight: float) -> float:
+        start = max(self.virtual_time, self.last_finish.get(client, 0.0))
+        self.last_finish[client] = start + 1.0 / max(weight, 1e-3)
+        if len(self.last_finish) > self.idle_clients:
+            # Clients at or behind virtual time have no backlog left to remember
+            self.last_finish = {c: f for c, f in self.last_finish.items() if f > self.virtual_time}
+        return start
+
+    def _dispatch(self):
+        while self.heap and self.active < max(1, self.capacity()):
+            start, _, client, future = heapq.heappop(self.heap)
+            if future.done():
+                # Timed out or cancelled while queued; already uncounted
+                continue
+            self._unqueue(client)
+            self.virtual_time = max(self.virtual_time, start)
+            self.active += 1
+            future.set_result(None)
+        FAIR_QUEUE_DEPTH.set(sum(self.queued.values()))
+
+    def _unqueue(self, client: str):
+        self.queued[client] -= 1
+        if not self.queued[client]:
+            del self.queued[client]
+
+    def _release(self):
+        self.active -= 1
+        self._dispatch()
+        if not self.active and not self.queued:
+            # Idle: nobody is behind anybody any more
+            self.virtual_time = max(self.last_finish.values(), default=self.virtual_time)
+            self.last_finish.clear()
+
+    @asynccontextmanager
+    async def slot(self, client: Optional[str] = None, weight: Optional[float] = None):
+        if client is None:
+            client, weight = current_client.get()
+        start = time.perf_counter()
+        if self.active < max(1, self.capacity()) and not self.queued:
+            # Nobody waiting: run now, but still charge the client's share
+            self.virtual_time = max(self.virtual_time, self._start(client, weight))
+            self.active += 1
+        else:
+            if self.queued.get(client, 0) >= self.max_queue_per_client:
+                self.rejected += 1
+                FAIR_QUEUE_REJECTIONS.labels("client_queue_full").inc()
+                raise AdmissionRejected(max(1, int(self.queue_timeout)))
+            future = asyncio.get_running_loop().create_future()
+            heapq.heappush(self.heap, (self._start(client, weight), next(self.sequence), client, future))
+            self.queued[client] = self.queued.get(client, 0) + 1
+            FAIR_QUEUE_DEPTH.set(sum(self.queued.values()))
+            try:
+                await asyncio.wait_for(asyncio.shield(future), timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                if not future.done():
+                    future.cancel()
+                    self._unqueue(client)
+                    self.rejected += 1
+                    FAIR_QUEUE_REJECTIONS.labels("timeout").inc()
+                    raise AdmissionRejected(max(1, int(self.queue_timeout)))
+                # Granted just as the timeout fired: use the slot
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # Granted, but the caller went away: hand the slot on
+                    self._release()
+                else:
+                    future.cancel()
+                    self._unqueue(client)
+                raise
+        FAIR_QUEUE_WAIT_SECONDS.observe(time.perf_counter() - start)
+        if client not in self.served and len(self.served) >= self.idle_clients:
+            self.served.clear()
+        self.served[client] = self.served.get(client, 0) + 1
+        try:
+            yield
+        finally:
+            self._release()
+
+    def snapshot(self) -> Dict:
+        busiest = sorted(self.served.items(), key=lambda item: -item[1])[:10]
+        return {
+            "capacity": self.capacity(),
+            "active": self.active,
+            "queued": sum(self.queued.values()),
+            "queued_clients": len(self.queued),
+            "rejected": self.rejected,
+            "served_by_client": dict(busiest),
+        }
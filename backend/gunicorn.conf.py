@@ -0,0 +1,63 @@
+"""Production serving: gunicorn managing uvicorn worker processes.
+
+    gunicorn main:app -c gunicorn.conf.py
+
+The app is imported once in the master (``preload_app``) and forked, so workers
+start fast and share the imported code; Redis and Bedrock clients are created per
+worker in the app's lifespan, after the fork. Each worker is recycled after about
+``MAX_REQUESTS`` requests (jittered so they do not all restart at once) and gets
+``GRACEFUL_TIMEOUT`` seconds to finish in-flight requests when recycled or on
+SIGTERM. Prometheus metrics from all workers are aggregated through
+``PROMETHEUS_MULTIPROC_DIR``, which is emptied here on start.
+"""
+import math
+import os
+import shutil
+
+def available_cpus() -> int:
+    # CPUs this container may use: the affinity mask capped by a cgroup CPU quota, which
+    # multiprocessing.cpu_count() ignores (it reports every core on the node)
+    cpus = len(os.sched_getaffinity(0))
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+    except OSError:
+        try:
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f, open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as g:
+                quota, period = f.read().strip(), g.read().strip()
+        except OSError:
+            return cpus
+    if quota in ("max", "-1"):
+        return cpus
+    return max(1, min(cpus, math.ceil(int(quota) / int(period))))
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+worker_class = "uvicorn.workers.UvicornWorker"
+# gunicorn also reads WEB_CONCURRENCY itself; main.py uses it to split the model rate limit
+workers = int(os.getenv("WEB_CONCURRENCY", available_cpus()))
+os.environ["WEB_CONCURRENCY"] = str(workers)
+preload_app = True
+
+max_requests = int(os.getenv("MAX_REQUESTS", 5000))
+max_requests_jitter = int(os.getenv("MAX_REQUESTS_JITTER", 500))
+# Below Kubernetes' default 30 s termination grace period, so in-flight requests finish before SIGKILL
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", 25))
+# Heartbeat timeout, not request timeout: an async worker stays responsive while requests wait on the model
+timeout = int(os.getenv("WORKER_TIMEOUT", 60))
+keepalive = int(os.getenv("KEEPALIVE", 5))
+
+accesslog = "-" if os.getenv("ACCESS_LOG", "false").lower() == "true" else None
+
+# Set before the app (and prometheus_client) is preloaded; metric files from a previous run would be added to this one's
+multiproc_dir = os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/prometheus-multiproc")
+shutil.rmtree(multiproc_dir, ignore_errors=True)
+os.makedirs(multiproc_dir, exist_ok=True)
+
+def when_ready(server):
+    # The master only preloaded the app; gauges it set on import are not a worker's and would never go away
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(os.getpid())
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
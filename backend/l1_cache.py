@@ -0,0 +1,97 @@
+import asyncio
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class L1Cache:
+    """Bounded in-process LRU of deserialized recipes in front of Redis.
+
+    Entries expire no later than their Redis copy. Writers publish the key on
+    ``channel`` and every other replica drops its local copy, so an entry refreshed
+    on one replica is not served stale from another.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600, channel: str = "recipe-invalidations"):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.channel = channel
+        self._instance = (None, "")
+        self.entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    @property
+    def instance_id(self) -> str:
+        # Lets the listener skip invalidations this process published itself. Made per process, since
+        # gunicorn workers forked from a preloading master would otherwise all share the master's id
+        if self._instance[0] != os.getpid():
+            self._instance = (os.getpid(), uuid.uuid4().hex)
+        return self._instance[1]
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self.entries.get(key)
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self.entries[key]
+            self.stats["expirations"] += 1
+            self.stats["misses"] += 1
+            return None
+        self.entries.move_to_end(key)
+        self.stats["hits"] += 1
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            return
+        self.entries[key] = (time.monotonic() + ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def invalidate(self, key: str):
+        if self.entries.pop(key, None) is not None:
+            self.stats["invalidations"] += 1
+
+    def invalidation_message(self, key: str) -> str:
+        return f"{self.instance_id}:{key}"
+
+    async def listen(self, redis_client, retry_delay: float = 1.0):
+        # Runs for the life of the process; resubscribes after Redis errors
+        needs_resync = False
+        while True:
+            pubsub = redis_client.pubsub()
+            try:
+                await pubsub.subscribe(self.channel)
+                if needs_resync:
+                    # Anything published while disconnected was missed. Cleared once back, not on every failed
+                    # reconnect, so L1 keeps serving through a Redis outage
+                    self.entries.clear()
+                    needs_resync = False
+                while True:
+                    # Poll rather than block, so the connection's socket timeout does not fire on an idle channel
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                    if message is None:
+                        continue
+                    sender, _, key = message["data"].partition(":")
+                    if sender != self.instance_id:
+                        self.invalidate(key)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"L1 invalidation listener error: {str(e)}")
+                needs_resync = True
+                await asyncio.sleep(retry_delay)
+            finally:
+                await pubsub.close()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {**self.stats, "size": len(self.entries), "max_entries": self.max_entries}
@@ -1,16 +1,46 @@
 from fastapi import FastAPI, HTTPException, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, computed_field
 import boto3
 import json
 import os
 import logging
 from dotenv import load_dotenv
-import redis
+import redis.asyncio as redis
 import hashlib
-import re
-from typing import List, Dict, Optional
-from botocore.exceptions import ClientError
+import math
+import random
+import asyncio
+import threading
+import time
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional, Tuple
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, generate_latest, multiprocess
+from singleflight import SingleFlight
+from streaming import RecipeStreamParser, sse_event
+from cache_keys import RECIPE_ID_PATTERN, normalize_ingredients, recipe_cache_key, recipe_content_id, recipe_context, recipe_id_key
+from l1_cache import L1Cache
+from providers import BedrockProvider, ModelProvider, StubProvider
+from router import Endpoint, ModelRouter, parse_endpoints
+from tiering import LARGE, SMALL, TierPolicy
+from prompts import GenerationBudget, get_template
+from similarity import SimilarityIndex
+from admission import AdmissionController, AdmissionRejected, THROTTLING_CODES
+from extraction import ExtractionError, extract_recipe
+from cache_codec import CacheCodecError, RecipeCodec, load_dictionary
+from warmer import CacheWarmer, parse_hours, popularity_member
+from circuit_breaker import CLOSED, CircuitBreaker
+from compression import CompressionMiddleware
+from capture import TrafficCapture, note_cache_outcome
+from fair_queue import INTERNAL_CLIENT, ClientIdentityMiddleware, FairScheduler, current_client, parse_weights
+from metrics import (
+    ADMISSION_LIMIT, CACHE_REFRESHES, CACHE_STALE_SERVES, DEPENDENCY_ERRORS, PARSE_FAILURES, PARSE_REPAIRS, instrumented, model_calls, record_cache, record_model_usage, request_timings,
+    server_timing_header, stage, track_stream
+)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -19,7 +49,15 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await startup()
+    try:
+        yield
+    finally:
+        await shutdown()
+
+app = FastAPI(lifespan=lifespan)
 
 # Configure CORS
 app.add_middleware(
@@ -29,170 +67,1214 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Brotli or gzip for complete JSON bodies; streams are left alone
+if os.getenv('RESPONSE_COMPRESSION', 'true').lower() == 'true':
+    app.add_middleware(CompressionMiddleware, minimum_size=int(os.getenv('RESPONSE_COMPRESSION_MIN_SIZE', 500)))
+# Who is asking, for fair queueing: an X-API-Key, else the client IP; CLIENT_WEIGHTS="key-or-ip=weight,..."
+app.add_middleware(
+    ClientIdentityMiddleware,
+    weights=parse_weights(os.getenv('CLIENT_WEIGHTS', '')),
+    default_weight=float(os.getenv('DEFAULT_CLIENT_WEIGHT', 1)),
+    trust_forwarded_for=os.getenv('TRUST_FORWARDED_FOR', 'false').lower() == 'true'
+)
 
-# Initialize Redis client
-logger.info("Initializing Redis client...")
-redis_host = os.getenv('REDIS_HOST', 'redis-service.default.svc.cluster.local','')  # Update this to your service name
+# Opt-in sampled capture of request traffic for replay.py (see capture.py)
+TRAFFIC_CAPTURE_FILE = os.getenv('TRAFFIC_CAPTURE_FILE', '')
+traffic_capture = None
+if TRAFFIC_CAPTURE_FILE:
+    traffic_capture = TrafficCapture(
+        TRAFFIC_CAPTURE_FILE,
+        sample_rate=float(os.getenv('TRAFFIC_CAPTURE_SAMPLE_RATE', 0.1)),
+        max_buffer=int(os.getenv('TRAFFIC_CAPTURE_MAX_BUFFER', 10000)),
+        flush_interval=float(os.getenv('TRAFFIC_CAPTURE_FLUSH_INTERVAL', 1.0)),
+        max_bytes=int(os.getenv('TRAFFIC_CAPTURE_MAX_BYTES', 256 * 1024 * 1024))
+    )
+
+def captured(endpoint: str, argument: str):
+    if traffic_capture is None:
+        return lambda func: func
+    return traffic_capture.captured(endpoint, argument)
+
+# Optional per-request stage timings in a Server-Timing response header
+if os.getenv('SERVER_TIMING_ENABLED', 'false').lower() == 'true':
+    @app.middleware("http")
+    async def add_server_timing(request: Request, call_next):
+        timings: Dict[str, float] = {}
+        token = request_timings.set(timings)
+        try:
+            response = await call_next(request)
+        finally:
+            request_timings.reset(token)
+        if timings:
+            response.headers["Server-Timing"] = server_timing_header(timings)
+        return response
+
+# Redis clients (asyncio, so cache round-trips never block the event loop) are created in startup().
+# Short timeouts and a bounded pool keep a slow Redis from stalling requests; the breaker skips it while down.
+redis_host = os.getenv('REDIS_HOST', 'redis-service.default.svc.cluster.local')  # Update this to your service name
 redis_port = int(os.getenv('REDIS_PORT', 6379))
-try:
+REDIS_MAX_CONNECTIONS = int(os.getenv('REDIS_MAX_CONNECTIONS', 64))
+REDIS_SOCKET_TIMEOUT = float(os.getenv('REDIS_SOCKET_TIMEOUT', 1.0))
+REDIS_CONNECT_TIMEOUT = float(os.getenv('REDIS_CONNECT_TIMEOUT', 0.5))
+REDIS_HEALTH_INTERVAL = float(os.getenv('REDIS_HEALTH_INTERVAL', 5))
+redis_client = None
+# Recipe values are binary (see cache_codec.py), so they go through a client that returns bytes
+cache_redis = None
+redis_breaker = CircuitBreaker(
+    "redis",
+    failure_threshold=int(os.getenv('REDIS_BREAKER_FAILURES', 5)),
+    reset_timeout=float(os.getenv('REDIS_BREAKER_RESET', 10))
+)
+# Whether /ready requires Redis; by default the service stays in rotation and serves from the model
+READY_REQUIRES_REDIS = os.getenv('READY_REQUIRES_REDIS', 'false').lower() == 'true'
+service_state = {"started": False, "shutting_down": False}
 
-    redis_client = redis.Redis(
+def redis_pool(decode_responses: bool) -> redis.ConnectionPool:
+    # Fails fast once max_connections are in use rather than queueing; the blocking pool in redis 5.0 also
+    # hangs for its whole timeout when a connect is refused, which is exactly when failing fast matters
+    return redis.ConnectionPool(
         host=redis_host,
         port=redis_port,
         db=0,
-        decode_responses=True
+        max_connections=REDIS_MAX_CONNECTIONS,
+        socket_timeout=REDIS_SOCKET_TIMEOUT,
+        socket_connect_timeout=REDIS_CONNECT_TIMEOUT,
+        health_check_interval=30,
+        decode_responses=decode_responses
+    )
+
+def record_redis_failure(error: Exception, operation: str):
+    # redis 5.0's pool raises ConnectionError("Too many connections") once max_connections are checked out.
+    # That is this replica's own load, not Redis failing: the caller degrades to a miss but the breaker,
+    # which would otherwise open and send every request to the model at peak load, is left alone
+    if isinstance(error, redis.ConnectionError) and str(error) == "Too many connections":
+        DEPENDENCY_ERRORS.labels("redis_pool", operation).inc()
+        return
+    redis_breaker.record_failure(error, operation)
+
+# boto3 is synchronous, so Bedrock calls run on a bounded thread pool instead of the event loop
+BEDROCK_MAX_WORKERS = int(os.getenv('BEDROCK_MAX_WORKERS', 32))
+bedrock_executor = ThreadPoolExecutor(max_workers=BEDROCK_MAX_WORKERS, thread_name_prefix='bedrock')
+
+# Model backend: Bedrock in production, or the offline stub for local runs and load tests. Created in startup().
+MODEL_PROVIDER = os.getenv('MODEL_PROVIDER', 'bedrock')
+if MODEL_PROVIDER not in ('bedrock', 'stub'):
+    raise ValueError(f"Unknown MODEL_PROVIDER: {MODEL_PROVIDER}")
+# Endpoints are "region/model-id" pairs; with more than one, calls are routed to the fastest healthy one
+BEDROCK_REGION = os.getenv('AWS_REGION') or 'us-east-1'
+BEDROCK_MODEL_ID = os.getenv('BEDROCK_MODEL_ID', 'meta.llama3-70b-instruct-v1:0')
+MODEL_ENDPOINTS = parse_endpoints(os.getenv('MODEL_ENDPOINTS', '')) or [(BEDROCK_REGION, BEDROCK_MODEL_ID)]
+# Share of calls that may send a hedged duplicate when the first is slower than its endpoint's p95 (0 disables)
+MODEL_HEDGE_RATIO = float(os.getenv('MODEL_HEDGE_RATIO', 0))
+# Hedge delay used until an endpoint has enough samples for a p95
+MODEL_HEDGE_DELAY = float(os.getenv('MODEL_HEDGE_DELAY', 4))
+# Simple requests try the small model first and escalate to the large one if its answer does not validate.
+# Opt-in: on by default only once small-model endpoints are configured, since the model must be enabled for the account
+MODEL_TIERING = os.getenv('MODEL_TIERING', 'true' if os.getenv('MODEL_SMALL_ENDPOINTS') else 'false').lower() == 'true'
+MODEL_SMALL_ENDPOINTS = (
+    parse_endpoints(os.getenv('MODEL_SMALL_ENDPOINTS', ''))
+    or [(BEDROCK_REGION, os.getenv('BEDROCK_SMALL_MODEL_ID', 'meta.llama3-1-8b-instruct-v1:0'))]
+)
+tier_policy = TierPolicy(
+    enabled=MODEL_TIERING,
+    max_complexity=float(os.getenv('TIER_MAX_COMPLEXITY', 5)),
+    cuisine_weight=float(os.getenv('TIER_CUISINE_WEIGHT', 1)),
+    dietary_weight=float(os.getenv('TIER_DIETARY_WEIGHT', 2)),
+    min_steps=int(os.getenv('TIER_MIN_STEPS', 3))
+)
+# A small model that keeps failing (e.g. not enabled for the account) is skipped, not paid for on every request
+small_tier_breaker = CircuitBreaker(
+    "model_small",
+    failure_threshold=int(os.getenv('MODEL_SMALL_BREAKER_FAILURES', 3)),
+    reset_timeout=float(os.getenv('MODEL_SMALL_BREAKER_RESET', 60))
+)
+bedrock_clients: Dict[str, object] = {}
+model_provider = None
+small_model_provider = None
+
+def bedrock_client(region: str):
+    if region not in bedrock_clients:
+        logger.info(f"Initializing Bedrock client for {region}...")
+        bedrock_clients[region] = boto3.client(
+            service_name='bedrock-runtime',
+            region_name=region,
+            aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
+            aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY'),
+            # One HTTP connection per executor thread, otherwise urllib3 queues calls behind a pool of 10.
+            # Retries are left to the admission layer so they are jittered and counted against its limits.
+            config=Config(max_pool_connections=BEDROCK_MAX_WORKERS, retries={"total_max_attempts": 1})
+        )
+        logger.info("Bedrock client initialized successfully")
+    return bedrock_clients[region]
+
+def build_provider(region: str, model_id: str, seed_offset: int = 0, small: bool = False) -> ModelProvider:
+    if MODEL_PROVIDER == 'stub':
+        # The small tier's stub is faster and can be made to give answers that fail validation
+        latency_scale = float(os.getenv('STUB_SMALL_LATENCY_SCALE', 0.35)) if small else 1.0
+        return StubProvider(
+            latency_distribution=os.getenv('STUB_LATENCY_DISTRIBUTION', 'lognormal'),
+            latency_mean=float(os.getenv('STUB_LATENCY_MEAN', 2.0)) * latency_scale,
+            latency_sigma=float(os.getenv('STUB_LATENCY_SIGMA', 0.3)),
+            error_rate=float(os.getenv('STUB_ERROR_RATE', 0.0)),
+            throttle_rate=float(os.getenv('STUB_THROTTLE_RATE', 0.0)),
+            seed=int(os.getenv('STUB_SEED', 0)) + seed_offset,
+            model_id=model_id,
+            invalid_rate=float(os.getenv('STUB_SMALL_INVALID_RATE', 0.0)) if small else 0.0
+        )
+    return BedrockProvider(bedrock_client(region), model_id)
+
+def build_routed_provider(endpoints: List[Tuple[str, str]], small: bool = False) -> ModelProvider:
+    providers = [build_provider(region, model_id, i + 100 * small, small) for i, (region, model_id) in enumerate(endpoints)]
+    if len(providers) == 1 and MODEL_HEDGE_RATIO <= 0:
+        return providers[0]
+    return ModelRouter(
+        [Endpoint(f"{region}/{model_id}", provider) for (region, model_id), provider in zip(endpoints, providers)],
+        explore_ratio=float(os.getenv('MODEL_EXPLORE_RATIO', 0.05)),
+        hedge_ratio=MODEL_HEDGE_RATIO,
+        hedge_delay=MODEL_HEDGE_DELAY
     )
-    # Test the connection
-    redis_client.ping()
-    logger.info("Redis client initialized successfully")
-except Exception as e:
-    logger.error(f"Failed to initialize Redis client: {str(e)}")
-    raise
-
-# Initialize Bedrock client
-logger.info("Initializing Bedrock client...")
-try:
-    bedrock_runtime = boto3.client(
-        service_name='bedrock-runtime',
-        region_name='us-east-1',
-        aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
-        aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY')
+
+def init_model_provider():
+    global model_provider, small_model_provider
+    model_provider = build_routed_provider(MODEL_ENDPOINTS)
+    logger.info(f"Using model provider: {model_provider.name} ({', '.join(f'{r}/{m}' for r, m in MODEL_ENDPOINTS)})")
+    if MODEL_TIERING and small_model_provider is None:
+        try:
+            small_model_provider = build_routed_provider(MODEL_SMALL_ENDPOINTS, small=True)
+            logger.info(f"Small model tier: {', '.join(f'{r}/{m}' for r, m in MODEL_SMALL_ENDPOINTS)}")
+        except Exception as e:
+            # Everything goes to the large tier
+            logger.error(f"Failed to initialize small model tier: {str(e)}")
+
+def invoke_model(body: Dict, provider: Optional[ModelProvider] = None):
+    # Unary calls go through the router's hedging; everything else runs the blocking call on the executor
+    provider = provider or model_provider
+    calls = model_calls.get()
+    if calls is not None:
+        calls[0] += 1
+    if isinstance(provider, ModelRouter):
+        return provider.invoke_hedged(body, bedrock_executor)
+    return asyncio.get_running_loop().run_in_executor(bedrock_executor, provider.invoke, body)
+
+# Prompt variant and generation-length budget; input and output tokens drive model latency and cost
+prompt_template = get_template(os.getenv('PROMPT_VARIANT', 'full'))
+MAX_GEN_LEN = int(os.getenv('MAX_GEN_LEN', 1024))
+generation_budget = None
+if os.getenv('DYNAMIC_GEN_LEN', 'true').lower() == 'true':
+    generation_budget = GenerationBudget(
+        base=int(os.getenv('GEN_LEN_BASE', 384)),
+        per_ingredient=int(os.getenv('GEN_LEN_PER_INGREDIENT', 64)),
+        floor=int(os.getenv('GEN_LEN_FLOOR', 256)),
+        ceiling=MAX_GEN_LEN,
+        headroom=float(os.getenv('GEN_LEN_HEADROOM', 1.3))
     )
-    logger.info("Bedrock client initialized successfully")
-except Exception as e:
-    logger.error(f"Failed to initialize Bedrock client: {str(e)}")
-    raise
+# A generation cut off at max_gen_len is continued with this many more tokens instead of regenerated (0 disables)
+CONTINUATION_MAX_GEN_LEN = int(os.getenv('CONTINUATION_MAX_GEN_LEN', 256))
+
+# Worker processes serving this app (gunicorn.conf.py reads the same variable). Every worker admits on its
+# own, so the pod-wide model rate limit is split between them
+SERVING_WORKERS = max(1, int(os.getenv('WEB_CONCURRENCY', 1)))
+
+# Client-side admission for model calls: rate limit, adaptive concurrency, retries and load shedding
+model_admission = AdmissionController(
+    rate=float(os.getenv('MODEL_RATE_LIMIT', 10)) / SERVING_WORKERS,
+    burst=max(1, int(os.getenv('MODEL_RATE_BURST', 20)) // SERVING_WORKERS),
+    max_concurrency=int(os.getenv('MODEL_MAX_CONCURRENCY', BEDROCK_MAX_WORKERS)),
+    min_concurrency=int(os.getenv('MODEL_MIN_CONCURRENCY', 1)),
+    max_queue=int(os.getenv('MODEL_MAX_QUEUE', 100)),
+    queue_timeout=float(os.getenv('MODEL_QUEUE_TIMEOUT', 10)),
+    max_retries=int(os.getenv('MODEL_MAX_RETRIES', 3)),
+    backoff_base=float(os.getenv('MODEL_BACKOFF_BASE', 0.25)),
+    backoff_max=float(os.getenv('MODEL_BACKOFF_MAX', 4))
+)
+
+# Weighted fair queueing of generations between clients, in front of model admission: as many run at once
+# as admission currently allows, and the rest wait their client's turn instead of first come, first served
+fair_scheduler = None
+if os.getenv('FAIR_QUEUEING', 'true').lower() == 'true':
+    fair_scheduler = FairScheduler(
+        capacity=lambda: int(model_admission.limit),
+        max_queue_per_client=int(os.getenv('FAIR_QUEUE_MAX_PER_CLIENT', 50)),
+        queue_timeout=float(os.getenv('FAIR_QUEUE_TIMEOUT', os.getenv('MODEL_QUEUE_TIMEOUT', 10)))
+    )
+
+# Stale-while-revalidate: an entry is fresh for RECIPE_CACHE_TTL (+/- jitter, so entries written together
+# do not expire together), then served stale for up to RECIPE_CACHE_STALE_TTL more while one task refreshes it
+RECIPE_CACHE_TTL = int(os.getenv('RECIPE_CACHE_TTL', 3600))
+RECIPE_CACHE_STALE_TTL = int(os.getenv('RECIPE_CACHE_STALE_TTL', 1800))
+RECIPE_CACHE_TTL_JITTER = float(os.getenv('RECIPE_CACHE_TTL_JITTER', 0.1))
+# Recipes by content id (GET /recipes/{id}): kept in Redis this long after the last read, cacheable by clients forever
+RECIPE_ID_TTL = int(os.getenv('RECIPE_ID_TTL', 30 * 24 * 3600))
+RECIPE_HTTP_MAX_AGE = int(os.getenv('RECIPE_HTTP_MAX_AGE', 365 * 24 * 3600))
+# Per-endpoint limit on how stale a served entry may be, e.g. "generate-recipe/batch=0,generate-recipe=1800"
+CACHE_MAX_STALE = {
+    endpoint: float(seconds)
+    for endpoint, seconds in (
+        item.split("=") for item in os.getenv('CACHE_MAX_STALE', '').split(",") if item.strip()
+    )
+}
+STALE_REFRESH_LEASE = int(os.getenv('STALE_REFRESH_LEASE', 60))
+refresh_tasks: Dict[str, asyncio.Task] = {}
+
+# Per-process cache counters, served on /cache/stats
+cache_stats = {"hits": 0, "stale_hits": 0, "approximate_hits": 0, "misses": 0}
+
+# Binary cache entries: CACHE_COMPRESSION is zstd, zlib or none; CACHE_DICTIONARY_FILE comes from `python cache_codec.py train`
+recipe_codec = RecipeCodec(
+    compression=os.getenv('CACHE_COMPRESSION', 'zstd'),
+    level=int(os.getenv('CACHE_COMPRESSION_LEVEL', 3)),
+    dictionary=load_dictionary(os.getenv('CACHE_DICTIONARY_FILE')),
+    compare_every=int(os.getenv('CACHE_CODEC_COMPARE_EVERY', 100))
+)
+# Redis memory budget, e.g. "512mb"; applied with CONFIG SET where the server allows it
+CACHE_MAX_MEMORY = os.getenv('CACHE_MAX_MEMORY')
+CACHE_EVICTION_POLICY = os.getenv('CACHE_EVICTION_POLICY', 'volatile-lru')
+
+# Optional in-process tier of deserialized recipes; replicas stay coherent via Redis pub/sub
+l1_cache = None
+if os.getenv('L1_CACHE_ENABLED', 'true').lower() == 'true':
+    l1_cache = L1Cache(
+        max_entries=int(os.getenv('L1_CACHE_MAX_ENTRIES', 1024)),
+        ttl=float(os.getenv('L1_CACHE_TTL', RECIPE_CACHE_TTL)),
+        channel=os.getenv('L1_CACHE_CHANNEL', 'recipe-invalidations')
+    )
+
+# Optional approximate-match tier: serve a cached recipe whose ingredient set is close enough
+similarity_index = None
+if os.getenv('SIMILARITY_ENABLED', 'false').lower() == 'true':
+    similarity_index = SimilarityIndex(
+        threshold=float(os.getenv('SIMILARITY_THRESHOLD', 0.75)),
+        max_entries=int(os.getenv('SIMILARITY_MAX_ENTRIES', 10000)),
+        ttl=RECIPE_CACHE_TTL + RECIPE_CACHE_STALE_TTL
+    )
+
+# Batch endpoint limits
+BATCH_MAX_ITEMS = int(os.getenv('BATCH_MAX_ITEMS', 500))
+BATCH_MAX_CONCURRENCY = int(os.getenv('BATCH_MAX_CONCURRENCY', 8))
+
+background_tasks: List[asyncio.Task] = []
+
+# Coalesce concurrent misses for the same recipe into one Bedrock call, across replicas via a Redis lease
+single_flight = SingleFlight(
+    lock_ttl=float(os.getenv('SINGLEFLIGHT_LOCK_TTL', 30)),
+    wait_timeout=float(os.getenv('SINGLEFLIGHT_WAIT_TIMEOUT', 30)),
+    poll_interval=float(os.getenv('SINGLEFLIGHT_POLL_INTERVAL', 0.1))
+)
+
+# Request counts per canonical request drive pre-warming of the most popular recipes
+POPULARITY_TRACKING = os.getenv('POPULARITY_TRACKING', 'true').lower() == 'true'
+WARMER_ENABLED = os.getenv('WARMER_ENABLED', 'false').lower() == 'true'
+cache_warmer = CacheWarmer(
+    top_n=int(os.getenv('WARMER_TOP_N', 100)),
+    budget=int(os.getenv('WARMER_BUDGET', 50)),
+    # Counted from the end of the fresh period, not the hard expiry
+    refresh_before=float(os.getenv('WARMER_REFRESH_BEFORE', 900)) + RECIPE_CACHE_STALE_TTL,
+    interval=float(os.getenv('WARMER_INTERVAL', 3600)),
+    hours=parse_hours(os.getenv('WARMER_HOURS', '')),
+    decay=float(os.getenv('WARMER_DECAY', 0.5)),
+    max_tracked=int(os.getenv('WARMER_MAX_TRACKED', 10000)),
+    flush_interval=float(os.getenv('POPULARITY_FLUSH_INTERVAL', 10)),
+    concurrency=int(os.getenv('WARMER_CONCURRENCY', 2))
+)
+
+async def startup():
+    # Nothing here may raise on a dependency blip: the process starts degraded and recovers on its own
+    global redis_client, cache_redis
+    # Set at import, i.e. in the gunicorn master when preloaded; each worker reports its own
+    ADMISSION_LIMIT.set(model_admission.limit)
+    if redis_client is None:
+        logger.info("Initializing Redis client...")
+        redis_client = redis.Redis(connection_pool=redis_pool(decode_responses=True))
+    if cache_redis is None:
+        cache_redis = redis.Redis(connection_pool=redis_pool(decode_responses=False))
+    if model_provider is None:
+        try:
+            init_model_provider()
+        except Exception as e:
+            # /ready stays 503 until this is fixed; liveness is unaffected, so there is no crash loop
+            logger.error(f"Failed to initialize model provider: {str(e)}")
+    if await check_redis():
+        logger.info("Redis client initialized successfully")
+        await on_redis_available()
+    else:
+        logger.error("Redis unavailable at startup, serving without the cache until it recovers")
+    background_tasks.append(asyncio.create_task(monitor_redis()))
+    if traffic_capture is not None:
+        background_tasks.append(asyncio.create_task(traffic_capture.run()))
+    if l1_cache is not None:
+        background_tasks.append(asyncio.create_task(l1_cache.listen(redis_client)))
+    if POPULARITY_TRACKING:
+        background_tasks.append(asyncio.create_task(cache_warmer.run(redis_client, warm_recipe, WARMER_ENABLED)))
+    service_state["started"] = True
+
+async def shutdown():
+    service_state["shutting_down"] = True
+    for task in background_tasks + list(refresh_tasks.values()):
+        task.cancel()
+    if traffic_capture is not None:
+        await traffic_capture.flush()
+    await redis_client.close()
+    await cache_redis.close()
+    bedrock_executor.shutdown(wait=False)
+
+async def check_redis() -> bool:
+    try:
+        await redis_client.ping()
+    except (redis.RedisError, OSError) as e:
+        record_redis_failure(e, "ping")
+        return False
+    redis_breaker.record_success()
+    return True
+
+async def on_redis_available():
+    # Work that needs Redis, run at startup or once it comes back
+    if CACHE_MAX_MEMORY:
+        await apply_memory_budget()
+    if similarity_index is not None:
+        background_tasks.append(asyncio.create_task(rebuild_similarity_index()))
+
+async def rebuild_similarity_index():
+    try:
+        await similarity_index.rebuild(cache_redis, decode=recipe_codec.decode)
+    except (redis.RedisError, OSError) as e:
+        record_redis_failure(e, "similarity_rebuild")
+        logger.error(f"Similarity index rebuild failed: {str(e)}")
+
+async def monitor_redis():
+    # Pings Redis so the breaker closes promptly once it is back, even if no request probes it
+    while True:
+        await asyncio.sleep(REDIS_HEALTH_INTERVAL)
+        was_down = redis_breaker.state != CLOSED
+        if was_down and not redis_breaker.allow():
+            continue
+        if await check_redis() and was_down:
+            logger.info("Redis is back, resuming cache use")
+            await on_redis_available()
+
+def require_model_provider():
+    if model_provider is None:
+        raise HTTPException(status_code=503, detail="Model provider is not available", headers={"Retry-After": "30"})
+
+def redis_for_coordination():
+    # Leases are best effort: without a healthy Redis, coalesce in-process only
+    return redis_client if redis_breaker.state == CLOSED else None
+
+async def apply_memory_budget():
+    try:
+        await redis_client.config_set("maxmemory", CACHE_MAX_MEMORY)
+        await redis_client.config_set("maxmemory-policy", CACHE_EVICTION_POLICY)
+        logger.info(f"Redis memory budget set to {CACHE_MAX_MEMORY} ({CACHE_EVICTION_POLICY})")
+    except redis.ResponseError as e:
+        # Managed Redis usually disables CONFIG; the budget then has to be set on the server itself
+        logger.warning(f"Could not apply Redis memory budget: {str(e)}")
+
+async def redis_memory_stats() -> Optional[Dict]:
+    try:
+        memory = await redis_client.info("memory")
+        stats = await redis_client.info("stats")
+    except redis.RedisError as e:
+        logger.warning(f"Could not read Redis memory stats: {str(e)}")
+        return None
+    return {
+        "used_bytes": memory.get("used_memory"),
+        "max_bytes": memory.get("maxmemory"),
+        "policy": memory.get("maxmemory_policy"),
+        "evicted_keys": stats.get("evicted_keys"),
+    }
 
 class RecipeRequest(BaseModel):
     ingredients: List[str]
     cuisine_type: Optional[str] = None
     dietary_restrictions: Optional[List[str]] = None
 
+class BatchRecipeRequest(BaseModel):
+    requests: List[RecipeRequest]
+
+class RecipeMatch(BaseModel):
+    approximate: bool
+    similarity: float
+    matched_ingredients: List[str]
+
 class RecipeResponse(BaseModel):
     cuisine_name: str
     steps: List[str]
     suggested_ingredients: List[str]
+    # Set only when the recipe was served for a similar, not identical, ingredient set
+    match: Optional[RecipeMatch] = None
+
+    @computed_field
+    @property
+    def id(self) -> str:
+        # Content address for GET /recipes/{id}
+        return recipe_content_id(self.cuisine_name, self.steps, self.suggested_ingredients)
+
+def build_prompt(
+    ingredients: List[str],
+    cuisine_type: Optional[str] = None,
+    dietary_restrictions: Optional[List[str]] = None
+) -> str:
+    return prompt_template.render(ingredients, cuisine_type, dietary_restrictions)
+
+def generation_body(prompt: str, max_gen_len: int = MAX_GEN_LEN) -> Dict:
+    return {
+        "prompt": prompt,
+        "max_gen_len": max_gen_len,
+        "temperature": 0.7,
+        "top_p": 0.95
+    }
+
+async def stream_generation(body: Dict, ingredients: List[str]):
+    # Pump the blocking model event stream on the executor and hand text chunks to the loop
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    stop = threading.Event()
 
-def generate_recipe(ingredients: List[str], cuisine_type: Optional[str] = None) -> Dict:
-    try:
-        # Create the prompt with special tokens
-        prompt = f"""<|begin_of_text|>
-<|start_header_id|>system<|end_header_id|>
-You are a trendy chef creating American-style fusion recipes for Indian users. Your task is to create a recipe using the given ingredients and format it as a JSON object. The cuisine name should be short, memorable, and appeal to Indian users who enjoy American food trends.
-
-If any ingredients don't work well together or aren't needed for the dish, mention this in a separate suggestion. Focus on creating fusion dishes that blend American trends with familiar flavors.
-<|eot_id|>
-
-<|start_header_id|>user<|end_header_id|>
-Create a recipe using these ingredients: {', '.join(ingredients)}.
-The cuisine name should be:
-1. Short and catchy (2-3 words max)
-2. Use trendy American food terms (e.g. "Loaded", "Smashed", "Epic")
-3. Sound delicious and modern
-
-Examples of good names:
-- "Epic Burger Bowl"
-- "Loaded Potato Stack"
-- "Smashed Sandwich Magic"
-- "Crispy Ranch Bites"
-
-Format the response as a JSON object with this structure:
-{{
-  "cuisine_name": "string",
-  "steps": [
-    "string",
-    "string",
-    "string"
-  ],
-  "suggested_ingredients": [
-    "string",  // First suggestion - either an enhancement or note about incompatible ingredients
-    "string"   // Second suggestion - either an enhancement or note about incompatible ingredients
-  ]
-}}
-
-For the suggested_ingredients:
-- If all ingredients work well together, suggest two ingredients that would enhance the dish
-- If any ingredients don't fit well, use one suggestion to explain which ingredient(s) might not be needed and why
-- Format enhancement suggestions like: "Crispy bacon bits - adds a savory American-style crunch"
-- Format compatibility notes like: "Note: The [ingredient] isn't needed here - it doesn't fit with this style of dish"
-
-Examples of good suggestions:
-- "Ranch seasoning - adds that classic American flavor everyone loves"
-- "Note: The cardamom isn't needed here - this dish works better with simple American spices"
-- "Crispy onions - gives that trendy burger-joint crunch"
-<|eot_id|>
-
-<|start_header_id|>assistant<|end_header_id|>"""
-
-        # Make the request to Bedrock
-        response = bedrock_runtime.invoke_model(
-            modelId="meta.llama3-70b-instruct-v1:0",
-            contentType="application/json",
-            accept="application/json",
-            body=json.dumps({
-                "prompt": prompt,
-                "max_gen_len": 1024,
-                "temperature": 0.7,
-                "top_p": 0.95
-            })
+    def pump():
+        try:
+            for chunk in model_provider.invoke_stream(body):
+                if stop.is_set():
+                    break
+                if "generation_token_count" in chunk:
+                    loop.call_soon_threadsafe(record_generation, ingredients, body["max_gen_len"], chunk)
+                loop.call_soon_threadsafe(queue.put_nowait, chunk.get('generation', ''))
+        except Exception as e:
+            loop.call_soon_threadsafe(queue.put_nowait, e)
+        finally:
+            loop.call_soon_threadsafe(queue.put_nowait, None)
+
+    # The slot is held for the whole stream; streams are not retried once started
+    async with model_admission.slot():
+        future = loop.run_in_executor(bedrock_executor, pump)
+        try:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    break
+                if isinstance(item, ClientError) and item.response.get('Error', {}).get('Code') in THROTTLING_CODES:
+                    model_admission.on_throttle()
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+            model_admission.on_success()
+        finally:
+            # Stops the pump early if the client disconnected
+            stop.set()
+            await future
+
+def max_gen_len_for(ingredients: List[str]) -> int:
+    return generation_budget.max_gen_len(len(ingredients)) if generation_budget is not None else MAX_GEN_LEN
+
+def record_generation(ingredients: List[str], max_gen_len: int, response_body: Dict):
+    record_model_usage(response_body, prompt_template.name)
+    if generation_budget is not None and "generation_token_count" in response_body:
+        generation_budget.observe(
+            len(ingredients), response_body["generation_token_count"], max_gen_len, response_body.get("stop_reason")
         )
-        
-        # Parse the response
-        response_body = json.loads(response['body'].read().decode('utf-8'))
-        generation_text = response_body.get('generation', '')
-        
-        if not generation_text:
-            raise HTTPException(status_code=500, detail="No response generated from the model")
-        
-        # Extract JSON from the response
-        json_match = re.search(r'\{[\s\S]*\}', generation_text)
-        if not json_match:
-            raise HTTPException(status_code=500, detail="Could not parse recipe from model response")
-        
-        recipe_json = json_match.group(0)
-        recipe = json.loads(recipe_json)
-        
-        return recipe
-        
+    logger.info(
+        f"Model call used {response_body.get('prompt_token_count')} prompt + "
+        f"{response_body.get('generation_token_count')} generation tokens "
+        f"(variant {prompt_template.name}, max_gen_len {max_gen_len}, stop {response_body.get('stop_reason')})"
+    )
+
+def parse_recipe(generation_text: str) -> Dict:
+    with stage("parse"):
+        recipe, repairs = extract_recipe(generation_text, RecipeResponse)
+    for repair in set(repairs):
+        PARSE_REPAIRS.labels(repair).inc()
+    if repairs:
+        logger.info(f"Repaired model response: {', '.join(sorted(set(repairs)))}")
+    return recipe
+
+async def continue_generation(body: Dict, generation_text: str) -> str:
+    # Feed the cut-off output back as the start of the assistant turn and let the model finish it
+    continuation = generation_body(body["prompt"] + generation_text, CONTINUATION_MAX_GEN_LEN)
+    with stage("model_continuation"):
+        response_body = await model_admission.call(lambda: invoke_model(continuation))
+    record_model_usage(response_body, prompt_template.name)
+    return generation_text + response_body.get('generation', '')
+
+async def parse_generation(body: Dict, response_body: Dict) -> Dict:
+    generation_text = response_body.get('generation', '')
+    
+    if not generation_text:
+        PARSE_FAILURES.labels("empty").inc()
+        raise HTTPException(status_code=500, detail="No response generated from the model")
+    
+    try:
+        return parse_recipe(generation_text)
+    except ExtractionError as e:
+        # Too little survived the cut-off: a short continuation is far cheaper than a full regeneration
+        if not (e.truncated and response_body.get('stop_reason') == 'length' and CONTINUATION_MAX_GEN_LEN > 0):
+            PARSE_FAILURES.labels(e.reason).inc()
+            raise HTTPException(status_code=500, detail=f"Could not parse recipe from model response: {str(e)}")
+        logger.warning(f"Model response truncated at {body['max_gen_len']} tokens, continuing generation")
+
+    generation_text = await continue_generation(body, generation_text)
+    try:
+        return parse_recipe(generation_text)
+    except ExtractionError as e:
+        PARSE_FAILURES.labels(e.reason).inc()
+        raise HTTPException(status_code=500, detail=f"Could not parse recipe from model response: {str(e)}")
+
+async def call_tier(tier: str, body: Dict, ingredients: List[str]) -> Dict:
+    provider = small_model_provider if tier == SMALL else model_provider
+    response_body = None
+    start = time.perf_counter()
+    try:
+        with stage("model_call" if tier == LARGE else "model_call_small"):
+            response_body = await model_admission.call(lambda: invoke_model(body, provider))
+    finally:
+        tier_policy.record_call(tier, provider.model_id, time.perf_counter() - start, response_body)
+    if tier == LARGE:
+        # The generation budget sizes max_gen_len for the large model; the small one writes differently
+        record_generation(ingredients, body["max_gen_len"], response_body)
+    else:
+        record_model_usage(response_body, prompt_template.name, SMALL)
+    return response_body
+
+async def try_small_tier(body: Dict, ingredients: List[str]) -> Tuple[Optional[Dict], Optional[str]]:
+    # (recipe, None) if the small model's answer is good enough, else (None, reason to escalate)
+    try:
+        response_body = await call_tier(SMALL, body, ingredients)
+    except (ClientError, BotoCoreError) as e:
+        # Service errors and transport failures (timeouts, unreachable endpoint) alike: the large model may still answer
+        reason = e.response['Error']['Code'] if isinstance(e, ClientError) else type(e).__name__
+        logger.warning(f"Small model call failed: {reason}")
+        small_tier_breaker.record_failure(e, "invoke")
+        return None, "error"
+    small_tier_breaker.record_success()
+    try:
+        recipe = parse_recipe(response_body.get('generation', ''))
+    except ExtractionError as e:
+        return None, e.reason
+    reason = tier_policy.acceptable(recipe)
+    return (None, reason) if reason else (recipe, None)
+
+@asynccontextmanager
+async def generation_slot():
+    # The caller's fair share of generation slots (see fair_queue.py)
+    if fair_scheduler is None:
+        yield
+        return
+    async with fair_scheduler.slot():
+        yield
+
+async def generate_with_tiers(
+    ingredients: List[str],
+    cuisine_type: Optional[str],
+    dietary_restrictions: Optional[List[str]]
+) -> Dict:
+    with stage("prompt_build"):
+        prompt = build_prompt(ingredients, cuisine_type, dietary_restrictions)
+        max_gen_len = max_gen_len_for(ingredients)
+        body = generation_body(prompt, max_gen_len)
+
+    tier = LARGE
+    if small_model_provider is not None and tier_policy.choose(ingredients, cuisine_type, dietary_restrictions) == SMALL:
+        tier = SMALL if small_tier_breaker.allow() else LARGE
+    if tier == SMALL:
+        recipe, reason = await try_small_tier(body, ingredients)
+        if recipe is not None:
+            tier_policy.record_outcome(SMALL, "served")
+            return recipe
+        tier_policy.record_outcome(SMALL, "escalated", reason)
+        logger.info(f"Escalating to the large model: small model answer rejected ({reason})")
+
+    # Make the request to the model off the event loop
+    response_body = await call_tier(LARGE, body, ingredients)
+    recipe = await parse_generation(body, response_body)
+    tier_policy.record_outcome(LARGE, "served")
+    return recipe
+
+async def generate_recipe(
+    ingredients: List[str],
+    cuisine_type: Optional[str] = None,
+    dietary_restrictions: Optional[List[str]] = None
+) -> Dict:
+    try:
+        require_model_provider()
+        async with generation_slot():
+            return await generate_with_tiers(ingredients, cuisine_type, dietary_restrictions)
+    except AdmissionRejected as e:
+        logger.warning(f"Shedding model call: {str(e)}")
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
     except ClientError as e:
         error_code = e.response['Error']['Code']
         error_message = e.response['Error']['Message']
         logger.error(f"AWS Bedrock error: {error_code} - {error_message}")
+        # Still throttled after retries: tell the client when to come back instead of failing hard
+        if error_code in THROTTLING_CODES:
+            raise HTTPException(
+                status_code=429,
+                detail=f"AWS Bedrock error: {error_code} - {error_message}",
+                headers={"Retry-After": str(model_admission.retry_after())}
+            )
         raise HTTPException(
             status_code=500,
             detail=f"AWS Bedrock error: {error_code} - {error_message}"
         )
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error generating recipe: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def max_stale_for(endpoint: str) -> float:
+    return min(CACHE_MAX_STALE.get(endpoint, RECIPE_CACHE_STALE_TTL), RECIPE_CACHE_STALE_TTL)
+
+def recipe_ttls() -> Tuple[float, int]:
+    # (fresh seconds, hard TTL in seconds) for a new entry
+    fresh = RECIPE_CACHE_TTL * random.uniform(1 - RECIPE_CACHE_TTL_JITTER, 1 + RECIPE_CACHE_TTL_JITTER)
+    return fresh, int(fresh + RECIPE_CACHE_STALE_TTL)
+
+async def get_cached_entries(cache_keys: List[str]) -> Dict[str, Tuple[RecipeResponse, float]]:
+    # cache_key -> (recipe, seconds past its fresh period; 0 when fresh)
+    with stage("cache_lookup"):
+        recipes = {}
+        remote_keys = []
+        for cache_key in cache_keys:
+            recipe = l1_cache.get(cache_key) if l1_cache is not None else None
+            if recipe is not None:
+                # L1 only ever holds the fresh part of an entry's life
+                recipes[cache_key] = (recipe, 0.0)
+            else:
+                remote_keys.append(cache_key)
+        if l1_cache is not None:
+            record_cache("l1", True, len(recipes))
+            record_cache("l1", False, len(remote_keys))
+        if not remote_keys or not redis_breaker.allow():
+            return recipes
+
+        # One round-trip for every value, plus remaining TTLs for staleness and so L1 copies never outlive Redis
+        try:
+            async with cache_redis.pipeline(transaction=False) as pipe:
+                pipe.mget(remote_keys)
+                for cache_key in remote_keys:
+                    pipe.pttl(cache_key)
+                cached_recipes, *ttls = await pipe.execute()
+        except (redis.RedisError, OSError) as e:
+            # Degrade to a miss: the model can still answer
+            record_redis_failure(e, "cache_lookup")
+            logger.warning(f"Redis cache lookup failed: {str(e)}")
+            return recipes
+        redis_breaker.record_success()
+        for cache_key, cached_recipe, ttl_ms in zip(remote_keys, cached_recipes, ttls):
+            if not cached_recipe:
+                continue
+            try:
+                recipe = RecipeResponse(**recipe_codec.decode(cached_recipe))
+            except CacheCodecError as e:
+                # Written with another dictionary or a newer format: regenerate rather than fail
+                logger.warning(f"Unreadable cache entry {cache_key}: {str(e)}")
+                continue
+            fresh_for = ttl_ms / 1000 - RECIPE_CACHE_STALE_TTL
+            recipes[cache_key] = (recipe, max(0.0, -fresh_for))
+            if l1_cache is not None and fresh_for > 0:
+                l1_cache.set(cache_key, recipe, fresh_for)
+        redis_hits = len(recipes) - (len(cache_keys) - len(remote_keys))
+        record_cache("redis", True, redis_hits)
+        record_cache("redis", False, len(remote_keys) - redis_hits)
+        return recipes
+
+async def get_cached_recipes(cache_keys: List[str], max_stale: float = math.inf) -> Dict[str, RecipeResponse]:
+    entries = await get_cached_entries(cache_keys)
+    return {key: recipe for key, (recipe, staleness) in entries.items() if staleness <= max_stale}
+
+async def get_cached_recipe(cache_key: str, max_stale: float = math.inf) -> Optional[RecipeResponse]:
+    return (await get_cached_recipes([cache_key], max_stale)).get(cache_key)
+
+async def cache_recipes(entries: List[Tuple[str, RecipeResponse, List[str], str]]):
+    # entries: (cache_key, recipe, canonical ingredients, context), written in one pipeline
+    with stage("cache_write"):
+        fresh_ttls = {cache_key: recipe_ttls() for cache_key, _, _, _ in entries}
+        if redis_breaker.allow():
+            try:
+                async with cache_redis.pipeline(transaction=False) as pipe:
+                    for cache_key, recipe, ingredients, context in entries:
+                        payload = recipe.model_dump(exclude={"match", "id"})
+                        # Stored alongside the recipe so the similarity index can be rebuilt from Redis
+                        payload["index"] = {"ingredients": ingredients, "context": context}
+                        value = recipe_codec.encode(payload)
+                        pipe.setex(cache_key, fresh_ttls[cache_key][1], value)
+                        # Immutable copy under its content id, outliving request-cache refreshes so shared links keep working
+                        pipe.setex(recipe_id_key(recipe.id), RECIPE_ID_TTL, value)
+                        if l1_cache is not None:
+                            # Other replicas drop any older copy they hold
+                            pipe.publish(l1_cache.channel, l1_cache.invalidation_message(cache_key))
+                    await pipe.execute()
+            except (redis.RedisError, OSError) as e:
+                # The recipe is still returned and kept in L1; only the shared copy is lost
+                record_redis_failure(e, "cache_write")
+                logger.warning(f"Redis cache write failed: {str(e)}")
+            else:
+                redis_breaker.record_success()
+    for cache_key, recipe, ingredients, context in entries:
+        if l1_cache is not None:
+            l1_cache.set(cache_key, recipe, fresh_ttls[cache_key][0])
+        if similarity_index is not None:
+            similarity_index.add(cache_key, ingredients, context)
+
+async def cache_recipe(cache_key: str, recipe: RecipeResponse, ingredients: List[str], context: str):
+    await cache_recipes([(cache_key, recipe, ingredients, context)])
+
+async def get_recipe_by_id(content_id: str) -> Optional[RecipeResponse]:
+    key = recipe_id_key(content_id)
+    if l1_cache is not None:
+        recipe = l1_cache.get(key)
+        if recipe is not None:
+            record_cache("by_id", True)
+            return recipe
+    if not redis_breaker.allow():
+        return None
+    try:
+        # Reads extend the expiry, so recipes that keep being opened stay available
+        value = await cache_redis.getex(key, ex=RECIPE_ID_TTL)
+    except (redis.RedisError, OSError) as e:
+        record_redis_failure(e, "recipe_by_id")
+        logger.warning(f"Redis lookup for recipe {content_id} failed: {str(e)}")
+        return None
+    redis_breaker.record_success()
+    record_cache("by_id", value is not None)
+    if value is None:
+        return None
+    try:
+        recipe = RecipeResponse(**recipe_codec.decode(value))
+    except CacheCodecError as e:
+        logger.warning(f"Unreadable recipe {content_id}: {str(e)}")
+        return None
+    if l1_cache is not None:
+        l1_cache.set(key, recipe, l1_cache.ttl)
+    return recipe
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    # Weak comparison, as If-None-Match requires; compressed responses carry W/ tags
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in (tag[2:] if tag.startswith("W/") else tag for tag in tags)
+
+async def find_similar_recipe(
+    endpoint: str,
+    cache_key: str,
+    ingredients: List[str],
+    context: str,
+    request: RecipeRequest
+) -> Optional[RecipeResponse]:
+    # Same staleness limit as an exact hit on this endpoint, and a stale match is refreshed the same way
+    if similarity_index is None:
+        return None
+    with stage("similarity_lookup"):
+        # The exact key was already looked up, and was missing or too stale to serve. Each match's
+        # ingredients are read now: the index can drop the entry while Redis is awaited below
+        candidates = [
+            (key, score, similarity_index.entries[key][1])
+            for key, score in similarity_index.matches(ingredients, context)
+            if key != cache_key
+        ]
+    for key, score, matched in candidates:
+        entry = (await get_cached_entries([key])).get(key)
+        if entry is None:
+            # Expired from Redis since it was indexed
+            similarity_index.remove(key)
+            continue
+        recipe, staleness = entry
+        if staleness > max_stale_for(endpoint):
+            continue
+        record_cache("similarity", True)
+        if staleness > 0:
+            # Indexed entries share the request's context, so its cuisine and restrictions regenerate them
+            CACHE_STALE_SERVES.labels(endpoint).inc()
+            schedule_refresh(key, sorted(matched), context, request.cuisine_type, request.dietary_restrictions)
+        return recipe.model_copy(update={"match": RecipeMatch(
+            approximate=True,
+            similarity=round(score, 3),
+            matched_ingredients=sorted(matched)
+        )})
+    record_cache("similarity", False)
+    return None
+
+async def generate_and_cache(
+    cache_key: str,
+    ingredients: List[str],
+    context: str,
+    cuisine_type: Optional[str],
+    dietary_restrictions: Optional[List[str]]
+) -> RecipeResponse:
+    # Generate from the canonical ingredients, since every alias of this key shares the result
+    recipe = RecipeResponse(**await generate_recipe(ingredients, cuisine_type, dietary_restrictions))
+    await cache_recipe(cache_key, recipe, ingredients, context)
+    return recipe
+
+async def refresh_recipe(
+    cache_key: str,
+    ingredients: List[str],
+    context: str,
+    cuisine_type: Optional[str],
+    dietary_restrictions: Optional[List[str]]
+) -> Optional[RecipeResponse]:
+    # Regenerates an existing entry; a short lease keeps it to one refresh across replicas
+    lease_key = f"refresh:{cache_key}"
+    lease_client = redis_for_coordination()
+    try:
+        if lease_client is not None and not await lease_client.set(lease_key, "1", nx=True, ex=STALE_REFRESH_LEASE):
+            CACHE_REFRESHES.labels("already_refreshing").inc()
+            return None
+    except (redis.RedisError, OSError) as e:
+        record_redis_failure(e, "refresh_lease")
+        lease_client = None
+    try:
+        recipe = await generate_and_cache(cache_key, ingredients, context, cuisine_type, dietary_restrictions)
+    except Exception:
+        CACHE_REFRESHES.labels("error").inc()
+        raise
+    finally:
+        if lease_client is not None:
+            try:
+                await lease_client.delete(lease_key)
+            except (redis.RedisError, OSError) as e:
+                # Expires on its own after STALE_REFRESH_LEASE
+                logger.warning(f"Failed to release {lease_key}: {str(e)}")
+    CACHE_REFRESHES.labels("ok").inc()
+    return recipe
+
+def schedule_refresh(
+    cache_key: str,
+    ingredients: List[str],
+    context: str,
+    cuisine_type: Optional[str],
+    dietary_restrictions: Optional[List[str]]
+):
+    if cache_key in refresh_tasks:
+        return
+
+    async def refresh():
+        # Runs in a copy of the request's context; the refresh is the service's work, not that client's
+        current_client.set(INTERNAL_CLIENT)
+        try:
+            await refresh_recipe(cache_key, ingredients, context, cuisine_type, dietary_restrictions)
+        except Exception as e:
+            # The stale copy keeps being served until the hard TTL, so a failed refresh is retried by the next request
+            logger.warning(f"Background refresh of {cache_key} failed: {str(e)}")
+
+    task = asyncio.create_task(refresh())
+    refresh_tasks[cache_key] = task
+    task.add_done_callback(lambda _: refresh_tasks.pop(cache_key, None))
+
+def serve_cached(
+    endpoint: str,
+    cache_key: str,
+    entry: Tuple[RecipeResponse, float],
+    ingredients: List[str],
+    context: str,
+    request: RecipeRequest
+) -> RecipeResponse:
+    # Counts the hit; a stale entry is returned as is while a background task regenerates it
+    recipe, staleness = entry
+    cache_stats["hits"] += 1
+    if staleness > 0:
+        cache_stats["stale_hits"] += 1
+        CACHE_STALE_SERVES.labels(endpoint).inc()
+        schedule_refresh(cache_key, ingredients, context, request.cuisine_type, request.dietary_restrictions)
+    return recipe
+
+async def warm_recipe(
+    ingredients: List[str],
+    cuisine_type: Optional[str],
+    dietary_restrictions: List[str]
+) -> Optional[RecipeResponse]:
+    # Regenerate even if an entry exists, since the warmer refreshes entries about to expire
+    cache_key = recipe_cache_key(ingredients, cuisine_type, dietary_restrictions)
+    context = recipe_context(cuisine_type, dietary_restrictions)
+    return await refresh_recipe(cache_key, ingredients, context, cuisine_type, dietary_restrictions)
+
 @app.post("/generate-recipe", response_model=RecipeResponse)
+@instrumented("generate-recipe")
+@captured("generate-recipe", "request")
 async def create_recipe(request: RecipeRequest):
     try:
         # Create cache key
-        cache_key = f"recipe:{':'.join(sorted(request.ingredients))}:{request.cuisine_type or 'any'}"
+        cache_key = recipe_cache_key(request.ingredients, request.cuisine_type, request.dietary_restrictions)
+        ingredients = normalize_ingredients(request.ingredients)
+        context = recipe_context(request.cuisine_type, request.dietary_restrictions)
+        if POPULARITY_TRACKING:
+            cache_warmer.record(popularity_member(request.ingredients, request.cuisine_type, request.dietary_restrictions))
         
-        # Check cache
-        cached_recipe = redis_client.get(cache_key)
-        if cached_recipe:
+        # Check cache; entries staler than this endpoint allows count as misses
+        max_stale = max_stale_for("generate-recipe")
+        entry = (await get_cached_entries([cache_key])).get(cache_key)
+        if entry and entry[1] <= max_stale:
             logger.info("Returning cached recipe")
-            return json.loads(cached_recipe)
-        
-        # Generate new recipe
-        recipe = generate_recipe(request.ingredients, request.cuisine_type)
-        
-        # Cache the result
-        redis_client.setex(cache_key, 3600, json.dumps(recipe))  # Cache for 1 hour
-        
-        return recipe
+            if similarity_index is not None and cache_key not in similarity_index.entries:
+                similarity_index.add(cache_key, ingredients, context)
+            note_cache_outcome("stale" if entry[1] > 0 else "hit")
+            return serve_cached("generate-recipe", cache_key, entry, ingredients, context, request)
+
+        similar_recipe = await find_similar_recipe("generate-recipe", cache_key, ingredients, context, request)
+        if similar_recipe:
+            cache_stats["approximate_hits"] += 1
+            note_cache_outcome("similar")
+            logger.info(f"Returning similar recipe (similarity {similar_recipe.match.similarity})")
+            return similar_recipe
+        cache_stats["misses"] += 1
+        note_cache_outcome("miss")
+
+        return await single_flight.do(
+            cache_key,
+            redis_for_coordination(),
+            lambda: generate_and_cache(
+                cache_key, ingredients, context, request.cuisine_type, request.dietary_restrictions
+            ),
+            lambda: get_cached_recipe(cache_key, max_stale)
+        )
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in create_recipe: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/generate-recipe/stream")
+async def stream_recipe(request: RecipeRequest):
+    cache_key = recipe_cache_key(request.ingredients, request.cuisine_type, request.dietary_restrictions)
+    ingredients = normalize_ingredients(request.ingredients)
+    context = recipe_context(request.cuisine_type, request.dietary_restrictions)
+
+    async def events():
+        try:
+            entry = (await get_cached_entries([cache_key])).get(cache_key)
+            if entry and entry[1] <= max_stale_for("generate-recipe/stream"):
+                cached_recipe = serve_cached("generate-recipe/stream", cache_key, entry, ingredients, context, request)
+            else:
+                cached_recipe = await find_similar_recipe("generate-recipe/stream", cache_key, ingredients, context, request)
+                if cached_recipe:
+                    cache_stats["approximate_hits"] += 1
+            if cached_recipe:
+                logger.info("Streaming cached recipe")
+                recipe = cached_recipe.model_dump()
+                yield sse_event("cuisine_name", recipe["cuisine_name"])
+                for step in recipe["steps"]:
+                    yield sse_event("step", step)
+                for suggestion in recipe["suggested_ingredients"]:
+                    yield sse_event("suggested_ingredient", suggestion)
+                yield sse_event("done", recipe)
+                return
+            cache_stats["misses"] += 1
+
+            require_model_provider()
+            # Forward the name and each step as soon as the parser sees them close
+            parser = RecipeStreamParser()
+            prompt = build_prompt(ingredients, request.cuisine_type, request.dietary_restrictions)
+            chunks = []
+            async with generation_slot():
+                generation = stream_generation(generation_body(prompt, max_gen_len_for(ingredients)), ingredients)
+                try:
+                    async for text in generation:
+                        chunks.append(text)
+                        for event, data in parser.feed(text):
+                            yield sse_event(event, data)
+                        if parser.done:
+                            break
+                finally:
+                    await generation.aclose()
+
+            # The events were best effort; the final recipe goes through the same extraction as the unary path
+            try:
+                recipe = RecipeResponse(**parse_recipe(''.join(chunks)))
+            except ExtractionError as e:
+                PARSE_FAILURES.labels(e.reason if parser.done else "incomplete_stream").inc()
+                raise ValueError(f"Could not parse recipe from model response: {str(e)}")
+
+            # Cache the assembled recipe so the next request is a hit
+            await cache_recipe(cache_key, recipe, ingredients, context)
+            yield sse_event("done", recipe.model_dump())
+
+        except ClientError as e:
+            error_code = e.response['Error']['Code']
+            error_message = e.response['Error']['Message']
+            logger.error(f"AWS Bedrock error: {error_code} - {error_message}")
+            yield sse_event("error", {"detail": f"AWS Bedrock error: {error_code} - {error_message}"})
+        except HTTPException as e:
+            yield sse_event("error", {"detail": e.detail})
+        except Exception as e:
+            logger.error(f"Error in stream_recipe: {str(e)}")
+            yield sse_event("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        track_stream("generate-recipe/stream", events()),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/generate-recipe/batch")
+@instrumented("generate-recipe/batch")
+@captured("generate-recipe/batch", "batch")
+async def create_recipes_batch(batch: BatchRecipeRequest, stream: bool = False):
+    if len(batch.requests) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Batch too large: at most {BATCH_MAX_ITEMS} requests")
+
+    # Deduplicate identical requests: each unique cache key is resolved once and fanned back out
+    items: Dict[str, Tuple[List[str], str, RecipeRequest]] = {}
+    indices: Dict[str, List[int]] = {}
+    for i, request in enumerate(batch.requests):
+        cache_key = recipe_cache_key(request.ingredients, request.cuisine_type, request.dietary_restrictions)
+        if cache_key not in items:
+            items[cache_key] = (
+                normalize_ingredients(request.ingredients),
+                recipe_context(request.cuisine_type, request.dietary_restrictions),
+                request
+            )
+        indices.setdefault(cache_key, []).append(i)
+
+    try:
+        entries = await get_cached_entries(list(items))
+    except Exception as e:
+        logger.error(f"Batch cache lookup failed: {str(e)}")
+        entries = {}
+    max_stale = max_stale_for("generate-recipe/batch")
+    cached_recipes = {
+        cache_key: serve_cached("generate-recipe/batch", cache_key, entry, *items[cache_key])
+        for cache_key, entry in entries.items()
+        if entry[1] <= max_stale
+    }
+    cache_stats["misses"] += len(items) - len(cached_recipes)
+    note_cache_outcome({"hits": len(cached_recipes), "misses": len(items) - len(cached_recipes)})
+
+    semaphore = asyncio.Semaphore(BATCH_MAX_CONCURRENCY)
+    generated: List[Tuple[str, RecipeResponse, List[str], str]] = []
+    written_back = False
+
+    async def generate(cache_key: str) -> RecipeResponse:
+        # Only runs when this batch leads the key's single flight; joiners get the result from the leader
+        ingredients, context, request = items[cache_key]
+        recipe = RecipeResponse(**await generate_recipe(ingredients, request.cuisine_type, request.dietary_restrictions))
+        if written_back:
+            # The batch has gone (client disconnected) but the shielded generation finished for other waiters
+            await cache_recipe(cache_key, recipe, ingredients, context)
+        else:
+            generated.append((cache_key, recipe, ingredients, context))
+        return recipe
+
+    async def resolve(cache_key: str) -> Tuple[str, Dict]:
+        if cache_key in cached_recipes:
+            return cache_key, {"status": "ok", "cached": True, "recipe": cached_recipes[cache_key].model_dump()}
+        try:
+            async with semaphore:
+                # Coalesced with concurrent misses for the same key, from /generate-recipe or other batches
+                recipe = await single_flight.do(
+                    cache_key,
+                    redis_for_coordination(),
+                    lambda: generate(cache_key),
+                    lambda: get_cached_recipe(cache_key, max_stale)
+                )
+        except Exception as e:
+            return cache_key, {"status": "error", "detail": getattr(e, "detail", str(e))}
+        return cache_key, {"status": "ok", "cached": False, "recipe": recipe.model_dump()}
+
+    async def write_back():
+        nonlocal written_back
+        written_back = True
+        if not generated:
+            return
+        try:
+            await cache_recipes(generated)
+        except Exception as e:
+            logger.error(f"Batch cache write failed: {str(e)}")
+
+    async def results():
+        tasks = [asyncio.ensure_future(resolve(cache_key)) for cache_key in items]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                cache_key, result = await next_done
+                for i in indices[cache_key]:
+                    yield {"index": i, **result}
+        finally:
+            # A disconnected client still gets whatever finished cached
+            for task in tasks:
+                task.cancel()
+            await write_back()
+
+    if stream:
+        async def lines():
+            async for result in results():
+                yield json.dumps(result) + "\n"
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    collected = [result async for result in results()]
+    return {"results": sorted(collected, key=lambda result: result["index"])}
+
+@app.get("/recipes/{recipe_id}", response_model=RecipeResponse)
+@instrumented("recipes")
+async def read_recipe(recipe_id: str, request: Request):
+    if not RECIPE_ID_PATTERN.fullmatch(recipe_id):
+        raise HTTPException(status_code=404, detail="Recipe not found")
+    # The id is a hash of the content, so a matching ETag is answered without looking anything up
+    headers = {"ETag": f'"{recipe_id}"', "Cache-Control": f"public, max-age={RECIPE_HTTP_MAX_AGE}, immutable"}
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    recipe = await get_recipe_by_id(recipe_id)
+    if recipe is None:
+        raise HTTPException(status_code=404, detail="Recipe not found")
+    return JSONResponse(recipe.model_dump(exclude={"match"}), headers=headers)
+
+@app.get("/cache/stats")
+async def get_cache_stats():
+    lookups = sum(cache_stats.values())
+    return {
+        **cache_stats,
+        "hit_rate": (cache_stats["hits"] + cache_stats["approximate_hits"]) / lookups if lookups else 0.0,
+        "l1": l1_cache.snapshot() if l1_cache is not None else None,
+        "similarity": similarity_index.snapshot() if similarity_index is not None else None,
+        "codec": recipe_codec.snapshot(),
+        "warmer": cache_warmer.snapshot() if POPULARITY_TRACKING else None,
+        "redis_memory": await redis_memory_stats(),
+        "model_router": model_provider.snapshot() if isinstance(model_provider, ModelRouter) else None,
+        "model_tiers": {**tier_policy.snapshot(), "small_breaker": small_tier_breaker.snapshot()},
+        "traffic_capture": traffic_capture.snapshot() if traffic_capture is not None else None,
+        "fair_queue": fair_scheduler.snapshot() if fair_scheduler is not None else None,
+        "serving_workers": SERVING_WORKERS,
+        "prompt_variant": prompt_template.name,
+        "max_gen_len_by_ingredient_count": generation_budget.snapshot() if generation_budget is not None else MAX_GEN_LEN
+    }
+
+@app.get("/metrics")
+async def get_metrics():
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        # Several worker processes: aggregate what they all wrote (see gunicorn.conf.py)
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy"}
+    # Liveness: the process is up and serving. Dependency trouble shows as "degraded" but never fails
+    # this check, so an orchestrator does not restart every replica when Redis or Bedrock has an outage.
+    degraded = redis_breaker.state != CLOSED or model_provider is None
+    return {
+        "status": "degraded" if degraded else "healthy",
+        "redis": redis_breaker.snapshot(),
+        "model_provider": model_provider.name if model_provider is not None else None
+    }
+
+@app.get("/ready")
+async def readiness_check():
+    # Readiness: whether this replica should receive traffic right now
+    problems = []
+    if not service_state["started"]:
+        problems.append("starting")
+    if service_state["shutting_down"]:
+        problems.append("shutting_down")
+    if model_provider is None:
+        problems.append("model_provider_unavailable")
+    if READY_REQUIRES_REDIS and not redis_breaker.available:
+        problems.append("redis_unavailable")
+    body = {
+        "ready": not problems,
+        "problems": problems,
+        "redis": redis_breaker.snapshot(),
+        "model_provider": model_provider.name if model_provider is not None else None
+    }
+    return JSONResponse(body, status_code=503 if problems else 200)
 
 if __name__ == "__main__":
     import uvicorn
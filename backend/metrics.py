@@ -0,0 +1,104 @@
+import functools
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from prometheus_client import Counter, Gauge, Histogram
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30)
+TOKEN_BUCKETS = (32, 64, 128, 256, 384, 512, 768, 1024, 1536, 2048)
+
+REQUEST_SECONDS = Histogram(
+    "redchef_request_seconds", "End-to-end handler latency", ["endpoint"], buckets=LATENCY_BUCKETS
+)
+STAGE_SECONDS = Histogram(
+    "redchef_stage_seconds", "Latency of each stage of recipe generation", ["stage"], buckets=LATENCY_BUCKETS
+)
+# multiprocess_mode combines gunicorn workers (see gunicorn.conf.py): work in progress is summed over the
+# pod, per-worker state is kept per pid, and the "live" modes drop workers that have been recycled
+IN_FLIGHT = Gauge("redchef_requests_in_flight", "Requests currently being handled", ["endpoint"], multiprocess_mode="livesum")
+CACHE_REQUESTS = Counter("redchef_cache_requests_total", "Cache lookups by tier and result", ["tier", "result"])
+MODEL_TOKENS = Histogram("redchef_model_tokens", "Tokens per model call", ["kind", "variant", "tier"], buckets=TOKEN_BUCKETS)
+MODEL_STOP_REASONS = Counter("redchef_model_stop_reasons_total", "Model stop reasons", ["reason"])
+PARSE_FAILURES = Counter("redchef_parse_failures_total", "Recipe extraction failures", ["reason"])
+PARSE_REPAIRS = Counter("redchef_parse_repairs_total", "Defects repaired while extracting recipes", ["repair"])
+ADMISSION_LIMIT = Gauge("redchef_admission_concurrency_limit", "Adaptive concurrency limit for model calls", multiprocess_mode="liveall")
+ADMISSION_WAITING = Gauge("redchef_admission_waiting", "Callers waiting for a model call slot", multiprocess_mode="livesum")
+ADMISSION_REJECTIONS = Counter("redchef_admission_rejections_total", "Model calls rejected with 429", ["reason"])
+MODEL_RETRIES = Counter("redchef_model_retries_total", "Model call retries by error code", ["code"])
+CACHE_CODEC_BYTES = Counter("redchef_cache_codec_bytes_total", "Cache entry bytes as plain JSON and as stored", ["kind"])
+CACHE_CODEC_SECONDS = Counter("redchef_cache_codec_seconds_total", "CPU time spent encoding and decoding cache entries", ["op"])
+WARMER_REFRESHES = Counter("redchef_warmer_refreshes_total", "Popular recipes regenerated by the cache warmer", ["result"])
+CACHE_STALE_SERVES = Counter("redchef_cache_stale_serves_total", "Cache entries served past their fresh TTL", ["endpoint"])
+CACHE_REFRESHES = Counter("redchef_cache_refreshes_total", "Regenerations of existing cache entries", ["result"])
+DEPENDENCY_STATE = Gauge("redchef_dependency_circuit_state", "Circuit state per dependency (0 closed, 1 half-open, 2 open)", ["dependency"], multiprocess_mode="livemax")
+DEPENDENCY_ERRORS = Counter("redchef_dependency_errors_total", "Failed calls to a dependency", ["dependency", "operation"])
+MODEL_ENDPOINT_CALLS = Counter("redchef_model_endpoint_calls_total", "Model calls per routed endpoint", ["endpoint", "result"])
+MODEL_ENDPOINT_LATENCY = Gauge("redchef_model_endpoint_latency_ewma_seconds", "Smoothed model call latency per endpoint", ["endpoint"], multiprocess_mode="liveall")
+MODEL_HEDGES = Counter("redchef_model_hedges_total", "Hedged model calls sent, and whether the hedge won", ["outcome"])
+MODEL_TIER_REQUESTS = Counter("redchef_model_tier_requests_total", "Generations per model tier, served or escalated", ["tier", "outcome"])
+MODEL_TIER_ESCALATIONS = Counter("redchef_model_tier_escalations_total", "Small-model answers rejected, by reason", ["reason"])
+MODEL_TIER_SECONDS = Histogram("redchef_model_tier_seconds", "Model call latency per tier", ["tier"], buckets=LATENCY_BUCKETS)
+MODEL_TIER_COST = Counter("redchef_model_tier_cost_dollars_total", "Estimated model spend per tier", ["tier"])
+TRAFFIC_CAPTURE_RECORDS = Counter("redchef_traffic_capture_records_total", "Captured request records written or dropped", ["result"])
+FAIR_QUEUE_DEPTH = Gauge("redchef_fair_queue_depth", "Generations waiting in the per-client fair queue", multiprocess_mode="livesum")
+FAIR_QUEUE_WAIT_SECONDS = Histogram("redchef_fair_queue_wait_seconds", "Time generations waited in the fair queue", buckets=LATENCY_BUCKETS)
+FAIR_QUEUE_REJECTIONS = Counter("redchef_fair_queue_rejections_total", "Generations rejected by the fair queue", ["reason"])
+
+# Per-request stage durations, set by the Server-Timing middleware when enabled
+request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_timings", default=None)
+# Model invocations (retries included) made by the current task, when something is counting them
+model_calls: ContextVar[Optional[List[int]]] = ContextVar("model_calls", default=None)
+
+@contextmanager
+def stage(name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.labels(name).observe(elapsed)
+        timings = request_timings.get()
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + elapsed
+
+@contextmanager
+def track_request(endpoint: str):
+    IN_FLIGHT.labels(endpoint).inc()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        REQUEST_SECONDS.labels(endpoint).observe(time.perf_counter() - start)
+        IN_FLIGHT.labels(endpoint).dec()
+
+def instrumented(endpoint: str):
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with track_request(endpoint):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+async def track_stream(endpoint: str, events):
+    # Streaming handlers return immediately, so track the body instead
+    with track_request(endpoint):
+        async for event in events:
+            yield event
+
+def record_cache(tier: str, hit: bool, count: int = 1):
+    if count:
+        CACHE_REQUESTS.labels(tier, "hit" if hit else "miss").inc(count)
+
+def record_model_usage(response_body: Dict, variant: str, tier: str = "large"):
+    if "prompt_token_count" in response_body:
+        MODEL_TOKENS.labels("prompt", variant, tier).observe(response_body["prompt_token_count"])
+    if "generation_token_count" in response_body:
+        MODEL_TOKENS.labels("generation", variant, tier).observe(response_body["generation_token_count"])
+    if response_body.get("stop_reason"):
+        MODEL_STOP_REASONS.labels(response_body["stop_reason"]).inc()
+
+def server_timing_header(timings: Dict[str, float]) -> str:
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items())
@@ -0,0 +1,219 @@
+"""Prompt templates and generation-length budgeting.
+
+Each variant's static scaffolding is rendered once at import; per request only the
+ingredient list and optional constraints are spliced in. Compare variants offline
+against the stub model with:
+
+    python prompts.py --compare
+"""
+import argparse
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+class PromptTemplate:
+    def __init__(self, name: str, head: str, tail: str):
+        self.name = name
+        # head ends where the ingredient list goes; tail starts after its closing period
+        self.head = head
+        self.tail = tail
+
+    def render(
+        self,
+        ingredients: List[str],
+        cuisine_type: Optional[str] = None,
+        dietary_restrictions: Optional[List[str]] = None
+    ) -> str:
+        constraints = ""
+        if cuisine_type:
+            constraints += f"\nCuisine style: {cuisine_type}."
+        if dietary_restrictions:
+            constraints += f"\nThe recipe must respect these dietary restrictions: {', '.join(dietary_restrictions)}."
+        return f"{self.head}{', '.join(ingredients)}.{constraints}{self.tail}"
+
+FULL = PromptTemplate(
+    "full",
+    head="""<|begin_of_text|>
+<|start_header_id|>system<|end_header_id|>
+You are a trendy chef creating American-style fusion recipes for Indian users. Your task is to create a recipe using the given ingredients and format it as a JSON object. The cuisine name should be short, memorable, and appeal to Indian users who enjoy American food trends.
+
+If any ingredients don't work well together or aren't needed for the dish, mention this in a separate suggestion. Focus on creating fusion dishes that blend American trends with familiar flavors.
+<|eot_id|>
+
+<|start_header_id|>user<|end_header_id|>
+Create a recipe using these ingredients: """,
+    tail="""
+The cuisine name should be:
+1. Short and catchy (2-3 words max)
+2. Use trendy American food terms (e.g. "Loaded", "Smashed", "Epic")
+3. Sound delicious and modern
+
+Examples of good names:
+- "Epic Burger Bowl"
+- "Loaded Potato Stack"
+- "Smashed Sandwich Magic"
+- "Crispy Ranch Bites"
+
+Format the response as a JSON object with this structure:
+{
+  "cuisine_name": "string",
+  "steps": [
+    "string",
+    "string",
+    "string"
+  ],
+  "suggested_ingredients": [
+    "string",  // First suggestion - either an enhancement or note about incompatible ingredients
+    "string"   // Second suggestion - either an enhancement or note about incompatible ingredients
+  ]
+}
+
+For the suggested_ingredients:
+- If all ingredients work well together, suggest two ingredients that would enhance the dish
+- If any ingredients don't fit well, use one suggestion to explain which ingredient(s) might not be needed and why
+- Format enhancement suggestions like: "Crispy bacon bits - adds a savory American-style crunch"
+- Format compatibility notes like: "Note: The [ingredient] isn't needed here - it doesn't fit with this style of dish"
+
+Examples of good suggestions:
+- "Ranch seasoning - adds that classic American flavor everyone loves"
+- "Note: The cardamom isn't needed here - this dish works better with simple American spices"
+- "Crispy onions - gives that trendy burger-joint crunch"
+<|eot_id|>
+
+<|start_header_id|>assistant<|end_header_id|>"""
+)
+
+COMPACT = PromptTemplate(
+    "compact",
+    head="""<|begin_of_text|><|start_header_id|>system<|end_header_id|>
+You are a trendy chef creating American-style fusion recipes for Indian users. Reply with one JSON object only, no prose.<|eot_id|><|start_header_id|>user<|end_header_id|>
+Ingredients: """,
+    tail="""
+Name: 2-3 catchy words using trendy American food terms, e.g. "Loaded Potato Stack", "Crispy Ranch Bites".
+suggested_ingredients: exactly two. Either an enhancement ("Crispy onions - gives that trendy burger-joint crunch") or, if an ingredient doesn't fit, a note ("Note: The cardamom isn't needed here - ...").
+JSON: {"cuisine_name": string, "steps": [string, ...], "suggested_ingredients": [string, string]}<|eot_id|><|start_header_id|>assistant<|end_header_id|>"""
+)
+
+MINIMAL = PromptTemplate(
+    "minimal",
+    head="""<|begin_of_text|><|start_header_id|>user<|end_header_id|>
+American-Indian fusion recipe with: """,
+    tail="""
+Only JSON: {"cuisine_name": "<2-3 catchy words>", "steps": ["..."], "suggested_ingredients": ["<enhancement or note>", "<enhancement or note>"]}<|eot_id|><|start_header_id|>assistant<|end_header_id|>"""
+)
+
+PROMPT_TEMPLATES: Dict[str, PromptTemplate] = {t.name: t for t in (FULL, COMPACT, MINIMAL)}
+
+def get_template(name: str) -> PromptTemplate:
+    if name not in PROMPT_TEMPLATES:
+        raise ValueError(f"Unknown prompt variant: {name} (expected one of {', '.join(PROMPT_TEMPLATES)})")
+    return PROMPT_TEMPLATES[name]
+
+def estimate_tokens(text: str) -> int:
+    # Llama 3 averages roughly four characters per token on English text
+    return max(1, len(text) // 4)
+
+class GenerationBudget:
+    """Chooses ``max_gen_len`` per request from the ingredient count.
+
+    Until a bucket has ``min_samples`` observations the budget is
+    ``base + per_ingredient * n``. After that it is the observed p95 generation
+    length for that ingredient count times ``headroom``. A generation cut off at
+    the limit raises that bucket's floor. Budgets stay within ``[floor, ceiling]``.
+    """
+
+    def __init__(
+        self,
+        base: int = 384,
+        per_ingredient: int = 64,
+        floor: int = 256,
+        ceiling: int = 1024,
+        headroom: float = 1.3,
+        min_samples: int = 20,
+        window: int = 200
+    ):
+        self.base = base
+        self.per_ingredient = per_ingredient
+        self.floor = floor
+        self.ceiling = ceiling
+        self.headroom = headroom
+        self.min_samples = min_samples
+        self.window = window
+        self.observed: Dict[int, Deque[int]] = {}
+        self.raised_floor: Dict[int, int] = {}
+
+    def bucket(self, ingredient_count: int) -> int:
+        return min(ingredient_count, 10)
+
+    def max_gen_len(self, ingredient_count: int) -> int:
+        bucket = self.bucket(ingredient_count)
+        samples = self.observed.get(bucket)
+        if samples is not None and len(samples) >= self.min_samples:
+            ordered = sorted(samples)
+            budget = int(ordered[int(0.95 * (len(ordered) - 1))] * self.headroom)
+        else:
+            budget = self.base + self.per_ingredient * ingredient_count
+        budget = max(budget, self.raised_floor.get(bucket, 0))
+        return max(self.floor, min(self.ceiling, budget))
+
+    def observe(self, ingredient_count: int, generation_tokens: int, max_gen_len: int, stop_reason: Optional[str]):
+        bucket = self.bucket(ingredient_count)
+        if stop_reason == "length":
+            # Truncated: the true length is unknown, so never budget below 1.5x this limit again
+            self.raised_floor[bucket] = min(self.ceiling, max(self.raised_floor.get(bucket, 0), int(max_gen_len * 1.5)))
+            return
+        self.observed.setdefault(bucket, deque(maxlen=self.window)).append(generation_tokens)
+
+    def snapshot(self) -> Dict[int, int]:
+        return {bucket: self.max_gen_len(bucket) for bucket in range(1, 11)}
+
+SAMPLE_INGREDIENTS = [
+    ["chicken", "garlic"],
+    ["paneer", "bell pepper", "onion"],
+    ["potato", "cheddar", "green chili", "butter"],
+    ["egg", "bread", "tomato", "coriander", "cumin"],
+    ["chickpea", "spinach", "yogurt", "lemon", "garlic", "ginger", "turmeric"],
+]
+
+def compare(samples: int, prefill_per_token: float, decode_per_token: float):
+    # Imported here so the app does not depend on the stub
+    from providers import StubProvider
+
+    print(f"{'variant':>8} {'prompt tok':>10} {'max_gen':>8} {'gen tok':>8} {'truncated':>9} {'latency ms':>10}")
+    for template in PROMPT_TEMPLATES.values():
+        # Latency is modeled from token counts rather than slept, so the comparison runs instantly
+        provider = StubProvider(
+            latency_distribution="fixed",
+            latency_mean=0.0,
+            prefill_latency_per_token=prefill_per_token,
+            decode_latency_per_token=decode_per_token
+        )
+        budget = GenerationBudget()
+        totals = {"prompt": 0, "max_gen": 0, "gen": 0, "truncated": 0, "latency": 0.0}
+        for i in range(samples):
+            ingredients = SAMPLE_INGREDIENTS[i % len(SAMPLE_INGREDIENTS)]
+            max_gen_len = budget.max_gen_len(len(ingredients))
+            body = {"prompt": template.render(ingredients), "max_gen_len": max_gen_len}
+            response_body = provider.response_body(body, provider.generation(body["prompt"]))
+            budget.observe(len(ingredients), response_body["generation_token_count"], max_gen_len, response_body["stop_reason"])
+            totals["prompt"] += response_body["prompt_token_count"]
+            totals["max_gen"] += max_gen_len
+            totals["gen"] += response_body["generation_token_count"]
+            totals["truncated"] += response_body["stop_reason"] == "length"
+            totals["latency"] += provider.token_latency(response_body)
+        print(
+            f"{template.name:>8} {totals['prompt'] / samples:>10.0f} {totals['max_gen'] / samples:>8.0f} "
+            f"{totals['gen'] / samples:>8.0f} {totals['truncated']:>9} {totals['latency'] / samples * 1000:>10.1f}"
+        )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--compare", action="store_true", help="run every variant against the stub model")
+    parser.add_argument("--samples", type=int, default=200)
+    parser.add_argument("--prefill-ms-per-token", type=float, default=0.2)
+    parser.add_argument("--decode-ms-per-token", type=float, default=2.0)
+    args = parser.parse_args()
+    if args.compare:
+        compare(args.samples, args.prefill_ms_per_token / 1000, args.decode_ms_per_token / 1000)
+    else:
+        for template in PROMPT_TEMPLATES.values():
+            print(f"{template.name:>8}: ~{estimate_tokens(template.render(['chicken', 'garlic', 'lemon']))} prompt tokens")
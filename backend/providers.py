@@ -0,0 +1,192 @@
+import hashlib
+import json
+import random
+import threading
+import time
+from typing import Dict, Iterator, List
+
+from botocore.exceptions import ClientError
+
+class ModelProvider:
+    """Blocking text-generation backend; calls run on the Bedrock executor.
+
+    ``invoke`` returns a Llama-on-Bedrock style body (``generation``,
+    ``prompt_token_count``, ``generation_token_count``, ``stop_reason``) and
+    ``invoke_stream`` yields the same fields chunk by chunk. Failures are raised as
+    botocore ``ClientError`` so callers handle every provider the same way.
+    """
+
+    name = "base"
+
+    def invoke(self, body: Dict) -> Dict:
+        raise NotImplementedError
+
+    def invoke_stream(self, body: Dict) -> Iterator[Dict]:
+        raise NotImplementedError
+
+class BedrockProvider(ModelProvider):
+    name = "bedrock"
+
+    def __init__(self, client, model_id: str = "meta.llama3-70b-instruct-v1:0"):
+        self.client = client
+        self.model_id = model_id
+
+    def invoke(self, body: Dict) -> Dict:
+        # Blocking: invoke_model and the streaming body read both do network I/O
+        response = self.client.invoke_model(
+            modelId=self.model_id,
+            contentType="application/json",
+            accept="application/json",
+            body=json.dumps(body)
+        )
+        return json.loads(response['body'].read().decode('utf-8'))
+
+    def invoke_stream(self, body: Dict) -> Iterator[Dict]:
+        response = self.client.invoke_model_with_response_stream(
+            modelId=self.model_id,
+            contentType="application/json",
+            accept="application/json",
+            body=json.dumps(body)
+        )
+        for event in response['body']:
+            yield json.loads(event['chunk']['bytes'])
+
+STUB_NAMES = ["Loaded", "Smashed", "Epic", "Crispy", "Fiery", "Street-Style"]
+STUB_DISHES = ["Bowl", "Stack", "Tacos", "Sliders", "Wrap", "Bites"]
+
+class StubProvider(ModelProvider):
+    """Offline stand-in for Bedrock for load tests and local development.
+
+    Output is a deterministic function of the prompt; latency, errors and
+    throttling are drawn from a seeded RNG. ``latency_distribution`` is one of
+    ``fixed`` (always ``latency_mean``), ``uniform`` (mean +/- sigma) or
+    ``lognormal`` (median ``latency_mean``, shape ``latency_sigma``). The optional
+    per-token costs add prompt-length and output-length dependent latency, and
+    output beyond ``max_gen_len`` is cut off with ``stop_reason`` "length".
+    ``invalid_rate`` of unary calls return a recipe without steps, as a weaker
+    model sometimes does.
+    """
+
+    name = "stub"
+
+    def __init__(
+        self,
+        latency_distribution: str = "lognormal",
+        latency_mean: float = 2.0,
+        latency_sigma: float = 0.3,
+        error_rate: float = 0.0,
+        throttle_rate: float = 0.0,
+        seed: int = 0,
+        model_id: str = "stub",
+        prefill_latency_per_token: float = 0.0,
+        decode_latency_per_token: float = 0.0,
+        invalid_rate: float = 0.0
+    ):
+        if latency_distribution not in ("fixed", "uniform", "lognormal"):
+            raise ValueError(f"Unknown latency distribution: {latency_distribution}")
+        self.latency_distribution = latency_distribution
+        self.latency_mean = latency_mean
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.model_id = model_id
+        self.prefill_latency_per_token = prefill_latency_per_token
+        self.decode_latency_per_token = decode_latency_per_token
+        self.invalid_rate = invalid_rate
+        self.rng = random.Random(seed)
+        # Executor threads share the RNG
+        self.lock = threading.Lock()
+        self.calls = 0
+
+    def sample_latency(self) -> float:
+        with self.lock:
+            if self.latency_distribution == "fixed":
+                return self.latency_mean
+            if self.latency_distribution == "uniform":
+                return max(0.0, self.rng.uniform(self.latency_mean - self.latency_sigma, self.latency_mean + self.latency_sigma))
+            return self.rng.lognormvariate(0.0, self.latency_sigma) * self.latency_mean
+
+    def check_failure(self, operation: str):
+        with self.lock:
+            self.calls += 1
+            roll = self.rng.random()
+        if roll < self.throttle_rate:
+            raise ClientError(
+                {"Error": {"Code": "ThrottlingException", "Message": "Too many requests, please wait before trying again."}},
+                operation
+            )
+        if roll < self.throttle_rate + self.error_rate:
+            raise ClientError(
+                {"Error": {"Code": "ModelErrorException", "Message": "The model encountered an error processing the request."}},
+                operation
+            )
+
+    def generation(self, prompt: str) -> str:
+        digest = hashlib.sha256(prompt.encode('utf-8')).digest()
+        recipe = {
+            "cuisine_name": f"{STUB_NAMES[digest[0] % len(STUB_NAMES)]} {STUB_DISHES[digest[1] % len(STUB_DISHES)]}",
+            "steps": [
+                f"Step {i + 1}: Heat the pan until it is properly hot, add everything for this stage and cook it "
+                f"with confidence, stirring so nothing catches, until it is golden, fragrant and ready for the next step."
+                for i in range(3 + digest[2] % 4)
+            ],
+            "suggested_ingredients": [
+                "Ranch seasoning - adds that classic American flavor everyone loves",
+                "Crispy onions - gives that trendy burger-joint crunch"
+            ]
+        }
+        # Real generations wrap the JSON in prose, so the extraction path gets exercised too
+        return f"Here's a recipe you'll love!\n\n{json.dumps(recipe, indent=2)}\n\nEnjoy!"
+
+    def response_body(self, body: Dict, generation: str) -> Dict:
+        stop_reason = "stop"
+        max_chars = body.get("max_gen_len", 2048) * 4
+        if len(generation) > max_chars:
+            generation = generation[:max_chars]
+            stop_reason = "length"
+        return {
+            "generation": generation,
+            "prompt_token_count": len(body.get("prompt", "")) // 4,
+            "generation_token_count": len(generation) // 4,
+            "stop_reason": stop_reason
+        }
+
+    def token_latency(self, response_body: Dict) -> float:
+        return (
+            response_body["prompt_token_count"] * self.prefill_latency_per_token
+            + response_body["generation_token_count"] * self.decode_latency_per_token
+        )
+
+    def continued_generation(self, prompt: str) -> str:
+        # A prompt that already contains part of the answer gets the rest of it, as a real model would
+        head, marker, partial = prompt.rpartition("<|end_header_id|>")
+        if not marker or not partial:
+            return self.generation(prompt)
+        generation = self.generation(head + marker)
+        return generation[len(partial):] if generation.startswith(partial) else generation
+
+    def invalid_generation(self, prompt: str) -> str:
+        digest = hashlib.sha256(prompt.encode('utf-8')).digest()
+        return json.dumps({"cuisine_name": f"{STUB_NAMES[digest[0] % len(STUB_NAMES)]} Thing", "suggested_ingredients": []})
+
+    def invoke(self, body: Dict) -> Dict:
+        with self.lock:
+            invalid = self.rng.random() < self.invalid_rate if self.invalid_rate else False
+        generation = self.invalid_generation(body.get("prompt", "")) if invalid else self.continued_generation(body.get("prompt", ""))
+        response_body = self.response_body(body, generation)
+        time.sleep(self.sample_latency() + self.token_latency(response_body))
+        self.check_failure("InvokeModel")
+        return response_body
+
+    def invoke_stream(self, body: Dict) -> Iterator[Dict]:
+        self.check_failure("InvokeModelWithResponseStream")
+        final = self.response_body(body, self.continued_generation(body.get("prompt", "")))
+        generation = final["generation"]
+        chunks: List[str] = [generation[i:i + 16] for i in range(0, len(generation), 16)]
+        delay = (self.sample_latency() + self.token_latency(final)) / max(len(chunks), 1)
+        for i, chunk in enumerate(chunks):
+            time.sleep(delay)
+            event = {"generation": chunk}
+            if i == len(chunks) - 1:
+                event.update({k: v for k, v in final.items() if k != "generation"})
+            yield event
@@ -0,0 +1,170 @@
+"""Replay captured traffic (see capture.py) against the app.
+
+Requests are sent open-loop on the captured schedule: ``--speed 10`` plays a
+captured hour in six minutes, ``--rate`` ignores the timestamps and sends at a
+fixed rate instead. A capture holds only a sample of the traffic, so the schedule
+is compressed by each record's ``sample_rate`` to offer the original request rate:
+at ``--speed 1`` an hour captured at 0.1 plays in six minutes. Without ``--target`` the app runs in-process on the stub model
+and fakeredis, as in benchmark.py; with it, any running build is exercised over
+HTTP. The report compares latency and cache outcomes with what was captured, and
+``--baseline`` compares it with an earlier report, e.g. from another build:
+
+    python replay.py capture.jsonl --speed 5 --json > before.json
+    python replay.py capture.jsonl --speed 5 --baseline before.json
+"""
+import argparse
+import asyncio
+import json
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+import httpx
+
+from benchmark import percentile
+
+REPLAYED_ENDPOINTS = {"generate-recipe", "generate-recipe/batch"}
+
+def load_capture(paths: List[str], endpoints: set, limit: Optional[int]) -> List[Dict]:
+    records = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if record.get("endpoint") in endpoints and record.get("request") is not None:
+                    records.append(record)
+    records.sort(key=lambda record: record["ts"])
+    return records[:limit] if limit else records
+
+def cache_outcomes(records: List[Dict]) -> Dict[str, float]:
+    outcomes = Counter(record["cache"] for record in records if isinstance(record.get("cache"), str))
+    total = sum(outcomes.values())
+    return {outcome: round(count / total, 4) for outcome, count in sorted(outcomes.items())} if total else {}
+
+def latency_summary(latencies_ms: List[float]) -> Dict[str, float]:
+    return {f"p{pct}_ms": round(percentile(latencies_ms, pct), 1) for pct in (50, 95, 99)}
+
+def hit_ratio(before: Dict, after: Dict) -> Optional[float]:
+    lookups = sum(after[k] - before[k] for k in ("hits", "approximate_hits", "misses"))
+    hits = sum(after[k] - before[k] for k in ("hits", "approximate_hits"))
+    return round(hits / lookups, 4) if lookups else None
+
+async def replay(args) -> Dict:
+    records = load_capture(args.capture, set(args.endpoint or REPLAYED_ENDPOINTS), args.limit)
+    if not records:
+        raise SystemExit("No replayable records in the capture")
+
+    if args.target:
+        client = httpx.AsyncClient(base_url=args.target, timeout=args.timeout)
+    else:
+        import main
+        from benchmark import start_app
+        from providers import StubProvider
+
+        await start_app(StubProvider(
+            latency_distribution="lognormal",
+            latency_mean=args.latency_mean,
+            latency_sigma=args.latency_sigma,
+            seed=args.seed
+        ), args.redis_url)
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://replay", timeout=args.timeout)
+
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    in_flight = asyncio.Semaphore(args.max_in_flight)
+    late = 0
+
+    async def send(record: Dict):
+        async with in_flight:
+            start = time.perf_counter()
+            try:
+                response = await client.post(f"/{record['endpoint']}", json=record["request"])
+                statuses[response.status_code] += 1
+            except httpx.HTTPError as e:
+                statuses[type(e).__name__] += 1
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    async with client:
+        stats_before = await cache_stats(client)
+        first_ts = records[0]["ts"]
+        start = time.perf_counter()
+        tasks = []
+        offset, previous_ts = 0.0, first_ts
+        for i, record in enumerate(records):
+            if args.rate:
+                offset = i / args.rate
+            else:
+                # Records captured before sample_rate was stored are taken as unsampled
+                offset += (record["ts"] - previous_ts) * record.get("sample_rate", 1.0) / args.speed
+                previous_ts = record["ts"]
+            delay = start + offset - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            elif delay < -0.1:
+                # The replayer itself fell behind the schedule
+                late += 1
+            tasks.append(asyncio.create_task(send(record)))
+        await asyncio.gather(*tasks)
+        wall = time.perf_counter() - start
+        stats_after = await cache_stats(client)
+
+    if not args.target:
+        await main.shutdown()
+
+    captured_span = records[-1]["ts"] - first_ts
+    return {
+        "requests": len(records),
+        "captured_seconds": round(captured_span, 1),
+        "replay_seconds": round(wall, 1),
+        "offered_rps": round(len(records) / wall, 2) if wall else None,
+        "late_sends": late,
+        "statuses": {str(status): count for status, count in statuses.items()},
+        "captured_latency": latency_summary([record["latency_ms"] for record in records if "latency_ms" in record]),
+        "replay_latency": latency_summary(latencies),
+        "captured_cache_outcomes": cache_outcomes(records),
+        "replay_cache_hit_ratio": hit_ratio(stats_before, stats_after) if stats_before and stats_after else None,
+    }
+
+async def cache_stats(client: httpx.AsyncClient) -> Optional[Dict]:
+    try:
+        response = await client.get("/cache/stats")
+        return response.json() if response.status_code == 200 else None
+    except httpx.HTTPError:
+        return None
+
+def print_report(report: Dict, baseline: Optional[Dict]):
+    for name, value in report.items():
+        line = f"{name:>24}: {value}"
+        if baseline is not None and name in baseline and baseline[name] != value:
+            line += f"  (baseline {baseline[name]})"
+        print(line)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("capture", nargs="+", help="capture JSONL file(s), e.g. capture.jsonl capture.jsonl.1")
+    parser.add_argument("--target", default=None, help="base URL of a running build; in-process stub if omitted")
+    parser.add_argument("--endpoint", action="append", help="only replay this endpoint (repeatable)")
+    parser.add_argument("--speed", type=float, default=1.0, help="time compression of the captured schedule")
+    parser.add_argument("--rate", type=float, default=None, help="fixed requests per second instead of the captured schedule")
+    parser.add_argument("--limit", type=int, default=None, help="replay only the first N records")
+    parser.add_argument("--max-in-flight", type=int, default=1000)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--latency-mean", type=float, default=2.0, help="in-process stub model latency")
+    parser.add_argument("--latency-sigma", type=float, default=0.3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--redis-url", default=None, help="in-process mode: use a real Redis (the db is flushed)")
+    parser.add_argument("--baseline", default=None, help="earlier --json report to compare with")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    report = asyncio.run(replay(args))
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        baseline = None
+        if args.baseline:
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        print_report(report, baseline)
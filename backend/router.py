@@ -0,0 +1,289 @@
+"""Latency-aware routing over several (region, model) endpoints.
+
+Every call goes to the endpoint with the lowest expected latency: an EWMA of its
+recent latencies, inflated by its EWMA error rate. Endpoints whose circuit is open
+are skipped, and a small share of calls explores the others so their estimates do
+not go stale. ``invoke_hedged`` also sends a duplicate to the runner-up endpoint
+when the first call is slower than the primary's recent p95, and keeps whichever
+answers first. Try it against stub endpoints with:
+
+    python router.py --requests 200 --hedge
+"""
+import asyncio
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
+
+from botocore.exceptions import ClientError
+
+from circuit_breaker import CircuitBreaker
+from metrics import MODEL_ENDPOINT_CALLS, MODEL_ENDPOINT_LATENCY, MODEL_HEDGES
+from providers import ModelProvider
+
+logger = logging.getLogger(__name__)
+
+def parse_endpoints(spec: str) -> List[Tuple[str, str]]:
+    # "us-east-1/meta.llama3-70b-instruct-v1:0,us-west-2/meta.llama3-70b-instruct-v1:0"
+    endpoints = []
+    for item in spec.split(","):
+        if item.strip():
+            region, _, model_id = item.strip().partition("/")
+            if not model_id:
+                raise ValueError(f"Model endpoint must be region/model-id: {item}")
+            endpoints.append((region, model_id))
+    return endpoints
+
+class Endpoint:
+    """One provider plus its latency and error estimates."""
+
+    def __init__(self, name: str, provider: ModelProvider, alpha: float = 0.2, window: int = 200, breaker: Optional[CircuitBreaker] = None):
+        self.name = name
+        self.provider = provider
+        self.alpha = alpha
+        self.latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.recent: Deque[float] = deque(maxlen=window)
+        self.breaker = breaker or CircuitBreaker(f"model:{name}")
+        self.calls = 0
+        self.errors = 0
+
+    def observe(self, latency: float, failed: bool):
+        self.calls += 1
+        self.errors += failed
+        self.error_rate += self.alpha * (failed - self.error_rate)
+        if not failed:
+            self.latency = latency if self.latency is None else self.latency + self.alpha * (latency - self.latency)
+            self.recent.append(latency)
+            MODEL_ENDPOINT_LATENCY.labels(self.name).set(self.latency)
+
+    def p95(self) -> Optional[float]:
+        if len(self.recent) < 20:
+            return None
+        ordered = sorted(self.recent)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+    def snapshot(self) -> Dict:
+        return {
+            "latency_ewma": round(self.latency, 4) if self.latency is not None else None,
+            "p95": self.p95(),
+            "error_rate_ewma": round(self.error_rate, 4),
+            "calls": self.calls,
+            "errors": self.errors,
+            "circuit": self.breaker.state,
+        }
+
+class ModelRouter(ModelProvider):
+    """A ``ModelProvider`` that spreads calls over ``endpoints``.
+
+    The blocking ``invoke``/``invoke_stream`` route without hedging, so streaming
+    and continuations work unchanged. ``invoke_hedged`` is the async entry point
+    used for unary generations. At most ``hedge_ratio`` of calls are hedged, which
+    bounds the extra model spend; ``hedge_delay`` is used until an endpoint has
+    enough samples for a p95. A Bedrock call cannot be interrupted once sent, so the
+    losing call runs to completion in its thread and only its result is dropped (its
+    latency still feeds the estimates).
+    """
+
+    name = "router"
+
+    def __init__(
+        self,
+        endpoints: List[Endpoint],
+        explore_ratio: float = 0.05,
+        error_penalty: float = 4.0,
+        hedge_ratio: float = 0.1,
+        hedge_delay: float = 2.0,
+        min_hedge_delay: float = 0.05,
+        seed: Optional[int] = None
+    ):
+        if not endpoints:
+            raise ValueError("ModelRouter needs at least one endpoint")
+        self.endpoints = endpoints
+        self.explore_ratio = explore_ratio
+        self.error_penalty = error_penalty
+        self.hedge_ratio = hedge_ratio
+        self.hedge_delay = hedge_delay
+        self.min_hedge_delay = min_hedge_delay
+        self.rng = random.Random(seed)
+        # Executor threads record results concurrently
+        self.lock = threading.Lock()
+        self.stats = {"calls": 0, "hedged": 0, "hedge_wins": 0, "hedge_skipped_budget": 0}
+
+    @property
+    def model_id(self) -> str:
+        return self.endpoints[0].provider.model_id
+
+    def expected_latency(self, endpoint: Endpoint) -> float:
+        # Untried endpoints go first so every endpoint gets an estimate
+        if endpoint.latency is None:
+            return 0.0
+        return endpoint.latency * (1 + self.error_penalty * endpoint.error_rate)
+
+    def ranked(self) -> List[Endpoint]:
+        # Fastest healthy endpoint first; open circuits last, so something is always tried
+        with self.lock:
+            healthy = [e for e in self.endpoints if e.breaker.available]
+            ordered = sorted(healthy, key=self.expected_latency)
+            if len(ordered) > 1 and self.rng.random() < self.explore_ratio:
+                ordered.insert(0, ordered.pop(self.rng.randrange(1, len(ordered))))
+        return ordered + [e for e in self.endpoints if e not in healthy]
+
+    def select(self) -> List[Endpoint]:
+        # Primary plus hedge candidate; allow() also lets a half-open endpoint take its probe
+        ranked = self.ranked()
+        chosen = []
+        for endpoint in ranked:
+            if endpoint.breaker.allow():
+                chosen.append(endpoint)
+                if len(chosen) == 2:
+                    break
+        return chosen or ranked[:1]
+
+    def call(self, endpoint: Endpoint, body: Dict) -> Dict:
+        start = time.monotonic()
+        try:
+            response_body = endpoint.provider.invoke(body)
+        except Exception as e:
+            with self.lock:
+                endpoint.observe(time.monotonic() - start, True)
+                endpoint.breaker.record_failure(e, "invoke")
+            MODEL_ENDPOINT_CALLS.labels(endpoint.name, "error").inc()
+            raise
+        with self.lock:
+            endpoint.observe(time.monotonic() - start, False)
+            endpoint.breaker.record_success()
+        MODEL_ENDPOINT_CALLS.labels(endpoint.name, "ok").inc()
+        return response_body
+
+    def invoke(self, body: Dict) -> Dict:
+        with self.lock:
+            self.stats["calls"] += 1
+        return self.call(self.select()[0], body)
+
+    def invoke_stream(self, body: Dict) -> Iterator[Dict]:
+        endpoint = self.select()[0]
+        start = time.monotonic()
+        try:
+            yield from endpoint.provider.invoke_stream(body)
+        except ClientError as e:
+            with self.lock:
+                endpoint.observe(time.monotonic() - start, True)
+                endpoint.breaker.record_failure(e, "invoke_stream")
+            MODEL_ENDPOINT_CALLS.labels(endpoint.name, "error").inc()
+            raise
+        with self.lock:
+            endpoint.observe(time.monotonic() - start, False)
+            endpoint.breaker.record_success()
+        MODEL_ENDPOINT_CALLS.labels(endpoint.name, "ok").inc()
+
+    def hedge_after(self, endpoint: Endpoint) -> float:
+        p95 = endpoint.p95()
+        return max(self.min_hedge_delay, p95 if p95 is not None else self.hedge_delay)
+
+    def take_hedge(self) -> bool:
+        with self.lock:
+            if self.stats["hedged"] + 1 > self.hedge_ratio * self.stats["calls"]:
+                self.stats["hedge_skipped_budget"] += 1
+                return False
+            self.stats["hedged"] += 1
+            return True
+
+    async def invoke_hedged(self, body: Dict, executor: Executor) -> Dict:
+        loop = asyncio.get_running_loop()
+        with self.lock:
+            self.stats["calls"] += 1
+        candidates = self.select()
+        primary_endpoint = candidates[0]
+        primary = loop.run_in_executor(executor, self.call, primary_endpoint, body)
+        if self.hedge_ratio <= 0:
+            return await primary
+        done, _ = await asyncio.wait({primary}, timeout=self.hedge_after(primary_endpoint))
+        if done or not self.take_hedge():
+            return await primary
+
+        # Slower than this endpoint usually is: race a duplicate on the runner-up
+        hedge_endpoint = candidates[1] if len(candidates) > 1 else primary_endpoint
+        MODEL_HEDGES.labels("sent").inc()
+        hedge = loop.run_in_executor(executor, self.call, hedge_endpoint, body)
+        pending = {primary, hedge}
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    error = future.exception()
+                    continue
+                for loser in pending:
+                    # Only drops the result; see the class docstring
+                    loser.cancel()
+                if future is hedge:
+                    with self.lock:
+                        self.stats["hedge_wins"] += 1
+                    MODEL_HEDGES.labels("won").inc()
+                else:
+                    MODEL_HEDGES.labels("lost").inc()
+                return future.result()
+        raise error
+
+    def snapshot(self) -> Dict:
+        with self.lock:
+            return {
+                **self.stats,
+                "endpoints": {e.name: e.snapshot() for e in self.endpoints},
+            }
+
+async def simulate(args):
+    # Stub endpoints with different speeds; one degrades halfway through
+    from concurrent.futures import ThreadPoolExecutor
+
+    from providers import StubProvider
+
+    means = [float(m) for m in args.latencies.split(",")]
+    providers = [
+        StubProvider("lognormal", latency_mean=mean, latency_sigma=args.sigma, seed=i, model_id=f"stub-{i}")
+        for i, mean in enumerate(means)
+    ]
+    router = ModelRouter(
+        [Endpoint(f"region-{i}", provider) for i, provider in enumerate(providers)],
+        hedge_ratio=args.hedge_ratio if args.hedge else 0.0,
+        hedge_delay=max(means) * 2,
+        seed=0
+    )
+    executor = ThreadPoolExecutor(max_workers=args.concurrency * 2)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies: List[float] = []
+
+    async def one(i: int):
+        if i == args.requests // 2:
+            providers[0].latency_mean *= args.degrade
+        async with semaphore:
+            start = time.monotonic()
+            await router.invoke_hedged({"prompt": f"request {i}", "max_gen_len": 512}, executor)
+            latencies.append(time.monotonic() - start)
+
+    await asyncio.gather(*(one(i) for i in range(args.requests)))
+    executor.shutdown(wait=True)
+    latencies.sort()
+    pct = lambda q: latencies[int(q * (len(latencies) - 1))] * 1000
+    print(f"p50 {pct(0.5):.0f} ms  p95 {pct(0.95):.0f} ms  p99 {pct(0.99):.0f} ms")
+    snapshot = router.snapshot()
+    print(f"hedged {snapshot['hedged']} of {snapshot['calls']}, hedge won {snapshot['hedge_wins']}")
+    for name, endpoint in snapshot["endpoints"].items():
+        print(f"{name:>10} calls {endpoint['calls']:>4} ewma {endpoint['latency_ewma']} s p95 {endpoint['p95']}")
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latencies", default="0.1,0.15,0.3", help="median stub latency per endpoint, seconds")
+    parser.add_argument("--sigma", type=float, default=0.5)
+    parser.add_argument("--degrade", type=float, default=5.0, help="slow-down factor for the first endpoint halfway through")
+    parser.add_argument("--hedge", action="store_true")
+    parser.add_argument("--hedge-ratio", type=float, default=0.1)
+    asyncio.run(simulate(parser.parse_args()))
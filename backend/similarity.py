@@ -0,0 +1,108 @@
+import json
+import logging
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+class SimilarityIndex:
+    """Inverted index from canonical ingredients to cached recipe keys.
+
+    Entries are partitioned by context (cuisine type and dietary restrictions), so
+    only recipes generated under the same constraints are candidates. Candidates
+    are scored by Jaccard similarity of their ingredient sets. The index holds at
+    most ``max_entries`` keys, evicting the least recently used.
+    """
+
+    def __init__(self, threshold: float = 0.75, max_entries: int = 10000, ttl: float = 3600):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # key -> (context, ingredients, expires_at)
+        self.entries: "OrderedDict[str, Tuple[str, FrozenSet[str], float]]" = OrderedDict()
+        self.postings: Dict[Tuple[str, str], Set[str]] = {}
+
+    def add(self, key: str, ingredients: Iterable[str], context: str, ttl: Optional[float] = None):
+        self.remove(key)
+        ingredient_set = frozenset(ingredients)
+        if not ingredient_set:
+            return
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        self.entries[key] = (context, ingredient_set, expires_at)
+        for ingredient in ingredient_set:
+            self.postings.setdefault((context, ingredient), set()).add(key)
+        while len(self.entries) > self.max_entries:
+            self.remove(next(iter(self.entries)))
+
+    def remove(self, key: str):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        context, ingredient_set, _ = entry
+        for ingredient in ingredient_set:
+            posting = self.postings.get((context, ingredient))
+            if posting is not None:
+                posting.discard(key)
+                if not posting:
+                    del self.postings[(context, ingredient)]
+
+    def matches(self, ingredients: Iterable[str], context: str, limit: int = 3) -> List[Tuple[str, float]]:
+        query = frozenset(ingredients)
+        overlap: Counter = Counter()
+        for ingredient in query:
+            overlap.update(self.postings.get((context, ingredient), ()))
+
+        now = time.monotonic()
+        scored = []
+        for key, shared in overlap.items():
+            _, ingredient_set, expires_at = self.entries[key]
+            if expires_at <= now:
+                continue
+            score = shared / len(query | ingredient_set)
+            if score >= self.threshold:
+                scored.append((key, score))
+        scored.sort(key=lambda item: item[1], reverse=True)
+        for key, _ in scored[:limit]:
+            self.entries.move_to_end(key)
+        return scored[:limit]
+
+    async def rebuild(
+        self,
+        redis_client,
+        pattern: str = "recipe:*",
+        batch_size: int = 500,
+        decode: Callable[[Any], Dict] = json.loads
+    ) -> int:
+        # Cached values carry their canonical ingredients under "index"; older entries without it are skipped
+        self.entries.clear()
+        self.postings.clear()
+        keys = []
+        async for key in redis_client.scan_iter(match=pattern, count=batch_size):
+            keys.append(key)
+            if len(keys) >= batch_size:
+                await self._index_batch(redis_client, keys, decode)
+                keys = []
+        if keys:
+            await self._index_batch(redis_client, keys, decode)
+        logger.info(f"Similarity index rebuilt with {len(self.entries)} recipes")
+        return len(self.entries)
+
+    async def _index_batch(self, redis_client, keys: List, decode: Callable[[Any], Dict]):
+        values = await redis_client.mget(keys)
+        for key, value in zip(keys, values):
+            if not value:
+                continue
+            try:
+                meta = decode(value).get("index")
+            except (ValueError, AttributeError):
+                continue
+            if meta:
+                self.add(key.decode() if isinstance(key, bytes) else key, meta["ingredients"], meta["context"])
+
+    def snapshot(self) -> Dict[str, float]:
+        return {
+            "size": len(self.entries),
+            "max_entries": self.max_entries,
+            "threshold": self.threshold,
+        }
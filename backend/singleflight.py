@@ -0,0 +1,98 @@
+import asyncio
+import logging
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Delete the lock only if we still own it, so an expired lease taken over by another replica is left alone
+RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+class SingleFlight:
+    """Coalesces concurrent cache misses for the same key into one generation.
+
+    Within a process, callers share one asyncio task per key. Across replicas, the
+    first caller takes a short Redis lease on ``lock:<key>``; other replicas poll
+    the cache for the leader's result and generate themselves only if the lease is
+    dropped without a result or ``wait_timeout`` passes. With ``redis_client`` None
+    (Redis unavailable) only the in-process coalescing applies.
+    """
+
+    def __init__(self, lock_ttl: float = 30.0, wait_timeout: float = 30.0, poll_interval: float = 0.1):
+        self.lock_ttl = lock_ttl
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+        self.inflight: Dict[str, asyncio.Task] = {}
+
+    async def do(
+        self,
+        key: str,
+        redis_client,
+        generate: Callable[[], Awaitable[Any]],
+        load_cached: Callable[[], Awaitable[Optional[Any]]],
+    ) -> Any:
+        task = self.inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._lead(key, redis_client, generate, load_cached))
+            self.inflight[key] = task
+            task.add_done_callback(lambda _: self.inflight.pop(key, None))
+        else:
+            logger.info(f"Joining in-flight generation for {key}")
+        # Shield so one caller disconnecting does not cancel the generation for everyone else
+        return await asyncio.shield(task)
+
+    async def _lead(self, key, redis_client, generate, load_cached) -> Any:
+        lock_key = f"lock:{key}"
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + self.wait_timeout
+        if redis_client is None:
+            return await generate()
+
+        while True:
+            acquired = await self._try_acquire(redis_client, lock_key, token)
+            if acquired:
+                try:
+                    # The previous holder may have finished between our cache miss and the lease
+                    cached = await load_cached()
+                    if cached is not None:
+                        return cached
+                    return await generate()
+                finally:
+                    await self._release(redis_client, lock_key, token)
+
+            # Another replica holds the lease: wait for it to publish the result
+            logger.info(f"Waiting on another replica's generation for {key}")
+            while time.monotonic() < deadline:
+                await asyncio.sleep(self.poll_interval)
+                cached = await load_cached()
+                if cached is not None:
+                    return cached
+                try:
+                    if not await redis_client.exists(lock_key):
+                        break
+                except Exception as e:
+                    logger.error(f"Failed to check lease {lock_key}: {str(e)}, generating locally")
+                    return await generate()
+            else:
+                logger.warning(f"Timed out waiting on lease for {key}, generating locally")
+                return await generate()
+
+    async def _try_acquire(self, redis_client, lock_key: str, token: str) -> bool:
+        try:
+            return bool(await redis_client.set(lock_key, token, nx=True, px=int(self.lock_ttl * 1000)))
+        except Exception as e:
+            # Without Redis we can still coalesce in-process
+            logger.error(f"Failed to acquire lease {lock_key}: {str(e)}")
+            return True
+
+    async def _release(self, redis_client, lock_key: str, token: str):
+        try:
+            await redis_client.eval(RELEASE_SCRIPT, 1, lock_key, token)
+        except Exception as e:
+            logger.error(f"Failed to release lease {lock_key}: {str(e)}")
@@ -0,0 +1,121 @@
+import json
+from typing import Dict, List, Optional, Tuple
+
+# Arrays whose string items are emitted one by one as they complete
+ITEM_EVENTS = {
+    "steps": "step",
+    "suggested_ingredients": "suggested_ingredient",
+}
+
+class RecipeStreamParser:
+    """Incremental parser for the recipe JSON object inside a token stream.
+
+    Feed it generation text as it arrives; ``feed`` returns the events completed by
+    that chunk: ``("cuisine_name", name)`` once the name string closes, and
+    ``("step", text)`` / ``("suggested_ingredient", text)`` for each array item.
+    Text before the first ``{`` and ``//`` comments outside strings are skipped.
+    Once the top-level object closes, ``done`` is set and ``recipe()`` returns it.
+    """
+
+    def __init__(self):
+        self.started = False
+        self.done = False
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.in_comment = False
+        self.pending_slash = False
+        self.string_buf: List[str] = []
+        self.key: Optional[str] = None
+        self.expect_key = True
+        # Key of the array we are inside at depth 2, if any
+        self.array_key: Optional[str] = None
+        self.object_buf: List[str] = []
+
+    def feed(self, text: str) -> List[Tuple[str, str]]:
+        events = []
+        for ch in text:
+            if self.done:
+                break
+            if not self.started:
+                if ch == '{':
+                    self.started = True
+                    self.depth = 1
+                    self.object_buf.append(ch)
+                continue
+            if self.in_string:
+                self.object_buf.append(ch)
+                if self.escape:
+                    self.escape = False
+                    self.string_buf.append(ch)
+                elif ch == '\\':
+                    self.escape = True
+                    self.string_buf.append(ch)
+                elif ch == '"':
+                    self.in_string = False
+                    event = self._close_string(''.join(self.string_buf))
+                    if event:
+                        events.append(event)
+                else:
+                    self.string_buf.append(ch)
+                continue
+            if self.in_comment:
+                if ch == '\n':
+                    self.in_comment = False
+                    self.object_buf.append(ch)
+                continue
+            if self.pending_slash:
+                self.pending_slash = False
+                if ch == '/':
+                    self.in_comment = True
+                    continue
+                self.object_buf.append('/')
+            if ch == '/':
+                self.pending_slash = True
+                continue
+
+            self.object_buf.append(ch)
+            if ch == '"':
+                self.in_string = True
+                self.string_buf = []
+            elif ch == ':':
+                self.expect_key = False
+            elif ch == ',':
+                if self.depth == 1:
+                    self.expect_key = True
+            elif ch in '{[':
+                self.depth += 1
+                if ch == '[' and self.depth == 2:
+                    self.array_key = self.key
+            elif ch in '}]':
+                self.depth -= 1
+                if self.depth == 1:
+                    self.array_key = None
+                elif self.depth == 0:
+                    self.done = True
+        return events
+
+    def _close_string(self, raw: str) -> Optional[Tuple[str, str]]:
+        try:
+            # strict=False takes raw newlines and tabs, which extraction.py repairs the same way
+            value = json.loads('"' + raw + '"', strict=False)
+        except json.JSONDecodeError:
+            # A malformed escape loses this event only; the final recipe goes through extraction
+            value = None
+        if self.depth == 1:
+            if self.expect_key:
+                self.key = raw if value is None else value
+                return None
+            if value is None:
+                return None
+            if self.key == "cuisine_name":
+                return ("cuisine_name", value)
+        elif self.depth == 2 and self.array_key in ITEM_EVENTS and value is not None:
+            return (ITEM_EVENTS[self.array_key], value)
+        return None
+
+    def recipe(self) -> Dict:
+        return json.loads(''.join(self.object_buf))
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
@@ -0,0 +1,110 @@
+"""Tiered model selection: simple requests go to a small model first.
+
+A request's complexity is its ingredient count plus weights for a cuisine style
+and each dietary restriction. Requests at or below ``max_complexity`` are sent to
+the small tier; its output must parse into a ``RecipeResponse`` with at least
+``min_steps`` steps, otherwise the request escalates to the large tier. Latency,
+token cost and escalations are tracked per tier.
+"""
+import threading
+from typing import Dict, List, Optional
+
+from metrics import MODEL_TIER_COST, MODEL_TIER_ESCALATIONS, MODEL_TIER_REQUESTS, MODEL_TIER_SECONDS
+
+SMALL, LARGE = "small", "large"
+
+# USD per 1000 tokens (input, output), Bedrock on-demand list prices
+MODEL_PRICES = {
+    "meta.llama3-1-8b-instruct-v1:0": (0.00022, 0.00022),
+    "meta.llama3-8b-instruct-v1:0": (0.0003, 0.0006),
+    "meta.llama3-1-70b-instruct-v1:0": (0.00099, 0.00099),
+    "meta.llama3-70b-instruct-v1:0": (0.00265, 0.0035),
+}
+
+def call_cost(model_id: str, response_body: Dict) -> float:
+    input_price, output_price = MODEL_PRICES.get(model_id.split("/")[-1], (0.0, 0.0))
+    return (
+        response_body.get("prompt_token_count", 0) * input_price
+        + response_body.get("generation_token_count", 0) * output_price
+    ) / 1000
+
+class TierPolicy:
+    """Chooses the model tier for a request and keeps per-tier statistics.
+
+    ``enabled`` False sends everything to the large tier (statistics are still
+    kept, so the baseline can be compared).
+    """
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        max_complexity: float = 5,
+        cuisine_weight: float = 1,
+        dietary_weight: float = 2,
+        min_steps: int = 3
+    ):
+        self.enabled = enabled
+        self.max_complexity = max_complexity
+        self.cuisine_weight = cuisine_weight
+        self.dietary_weight = dietary_weight
+        self.min_steps = min_steps
+        self.lock = threading.Lock()
+        self.stats = {
+            tier: {"requests": 0, "served": 0, "escalated": 0, "model_seconds": 0.0, "cost": 0.0}
+            for tier in (SMALL, LARGE)
+        }
+
+    def complexity(self, ingredients: List[str], cuisine_type: Optional[str], dietary_restrictions: Optional[List[str]]) -> float:
+        return (
+            len(ingredients)
+            + (self.cuisine_weight if cuisine_type else 0)
+            + self.dietary_weight * len(dietary_restrictions or [])
+        )
+
+    def choose(self, ingredients: List[str], cuisine_type: Optional[str], dietary_restrictions: Optional[List[str]]) -> str:
+        if self.enabled and self.complexity(ingredients, cuisine_type, dietary_restrictions) <= self.max_complexity:
+            return SMALL
+        return LARGE
+
+    def acceptable(self, recipe: Dict) -> Optional[str]:
+        # Schema validity is checked by the extractor; this catches valid but thin answers
+        if len(recipe.get("steps") or []) < self.min_steps:
+            return "too_few_steps"
+        return None
+
+    def record_call(self, tier: str, model_id: str, seconds: float, response_body: Optional[Dict]):
+        cost = call_cost(model_id, response_body) if response_body else 0.0
+        MODEL_TIER_SECONDS.labels(tier).observe(seconds)
+        MODEL_TIER_COST.labels(tier).inc(cost)
+        with self.lock:
+            self.stats[tier]["model_seconds"] += seconds
+            self.stats[tier]["cost"] += cost
+
+    def record_outcome(self, tier: str, outcome: str, reason: Optional[str] = None):
+        # outcome is "served" or "escalated"
+        MODEL_TIER_REQUESTS.labels(tier, outcome).inc()
+        if reason is not None:
+            MODEL_TIER_ESCALATIONS.labels(reason).inc()
+        with self.lock:
+            self.stats[tier]["requests"] += 1
+            self.stats[tier][outcome] += 1
+
+    def snapshot(self) -> Dict:
+        with self.lock:
+            tiers = {}
+            for tier, stats in self.stats.items():
+                requests = stats["requests"]
+                tiers[tier] = {
+                    **stats,
+                    "cost": round(stats["cost"], 6),
+                    "escalation_rate": stats["escalated"] / requests if requests else None,
+                    "mean_model_seconds": stats["model_seconds"] / requests if requests else None,
+                    "cost_per_request": stats["cost"] / requests if requests else None,
+                }
+            total = sum(stats["requests"] for stats in self.stats.values()) - self.stats[SMALL]["escalated"]
+            return {
+                "enabled": self.enabled,
+                "max_complexity": self.max_complexity,
+                "small_share": self.stats[SMALL]["served"] / total if total else None,
+                "tiers": tiers,
+            }
@@ -0,0 +1,227 @@
+"""Keeps the most requested recipes in cache.
+
+``create_recipe`` counts requests per canonical request (normalized ingredients,
+cuisine and restrictions) in a Redis sorted set. Each warming run takes the top-N,
+finds the ones missing from cache or about to expire, and regenerates as many as
+the model-call budget allows, most popular first. Scores decay after every run so
+the ranking follows current traffic. Run once by hand with:
+
+    python warmer.py --top 100 --budget 50 [--dry-run]
+"""
+import asyncio
+import json
+import logging
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from cache_keys import normalize_ingredients, normalize_text, recipe_cache_key
+from metrics import WARMER_REFRESHES, model_calls
+
+logger = logging.getLogger(__name__)
+
+def popularity_member(
+    ingredients: List[str],
+    cuisine_type: Optional[str] = None,
+    dietary_restrictions: Optional[List[str]] = None
+) -> str:
+    # Canonical, so every spelling of a request counts towards the same entry and regenerates the same key
+    return json.dumps([
+        normalize_ingredients(ingredients),
+        normalize_text(cuisine_type or "") or None,
+        sorted({normalize_text(d) for d in dietary_restrictions or [] if normalize_text(d)}),
+    ], separators=(",", ":"))
+
+def parse_hours(spec: str) -> Optional[Tuple[int, int]]:
+    # "2-6" is 02:00 to 05:59 UTC; "22-4" wraps past midnight
+    if not spec:
+        return None
+    start, end = spec.split("-")
+    return int(start) % 24, int(end) % 24
+
+class CacheWarmer:
+    """Popularity tracking plus periodic refresh of the hottest recipes.
+
+    ``record`` is called on the request path and only bumps an in-process counter;
+    ``flush`` writes the counts to ``key`` in one pipeline. ``warm`` spends at most
+    ``budget`` model calls per run on the ``top_n`` entries whose cache TTL is below
+    ``refresh_before`` seconds (or that are missing). A Redis lease makes sure only
+    one replica warms per ``interval``, and ``hours`` restricts runs to off-peak
+    hours (UTC).
+    """
+
+    def __init__(
+        self,
+        key: str = "popular:recipes",
+        top_n: int = 100,
+        budget: int = 50,
+        refresh_before: float = 900,
+        interval: float = 3600,
+        hours: Optional[Tuple[int, int]] = None,
+        decay: float = 0.5,
+        max_tracked: int = 10000,
+        flush_interval: float = 10.0,
+        concurrency: int = 2
+    ):
+        self.key = key
+        self.top_n = top_n
+        self.budget = budget
+        self.refresh_before = refresh_before
+        self.interval = interval
+        self.hours = hours
+        self.decay = decay
+        self.max_tracked = max_tracked
+        self.flush_interval = flush_interval
+        self.concurrency = concurrency
+        self.pending: Counter = Counter()
+        self.last_run: Optional[Dict] = None
+
+    def record(self, member: str):
+        self.pending[member] += 1
+
+    async def flush(self, redis_client):
+        if not self.pending:
+            return
+        pending, self.pending = self.pending, Counter()
+        try:
+            async with redis_client.pipeline(transaction=False) as pipe:
+                for member, count in pending.items():
+                    pipe.zincrby(self.key, count, member)
+                # Keep only the most popular entries
+                pipe.zremrangebyrank(self.key, 0, -self.max_tracked - 1)
+                await pipe.execute()
+        except Exception:
+            # Kept for the next flush rather than lost with the interval's counts
+            self.pending.update(pending)
+            raise
+
+    def off_peak(self, now: Optional[datetime] = None) -> bool:
+        if self.hours is None:
+            return True
+        hour = (now or datetime.now(timezone.utc)).hour
+        start, end = self.hours
+        return start <= hour < end if start <= end else hour >= start or hour < end
+
+    async def plan(self, redis_client) -> List[Tuple[str, str, float]]:
+        # (member, cache_key, score) of the top entries that need generating, most popular first
+        top = await redis_client.zrevrange(self.key, 0, self.top_n - 1, withscores=True)
+        if not top:
+            return []
+        keys = []
+        for member, _ in top:
+            ingredients, cuisine_type, dietary_restrictions = json.loads(member)
+            keys.append(recipe_cache_key(ingredients, cuisine_type, dietary_restrictions))
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for cache_key in keys:
+                pipe.pttl(cache_key)
+            ttls = await pipe.execute()
+        # PTTL is -2 for a missing key
+        return [
+            (member, cache_key, score)
+            for (member, score), cache_key, ttl_ms in zip(top, keys, ttls)
+            if ttl_ms < self.refresh_before * 1000
+        ]
+
+    async def warm(self, redis_client, refresh: Callable[[List[str], Optional[str], List[str]], Awaitable]) -> Dict:
+        start = time.monotonic()
+        await self.flush(redis_client)
+        candidates = await self.plan(redis_client)
+        result = {
+            "candidates": len(candidates), "refreshed": 0, "skipped": 0, "failed": 0, "over_budget": 0, "model_calls": 0
+        }
+        # Shared by the workers, so candidates are started most popular first
+        queue = iter(candidates)
+        # Model calls spent plus one reserved for each refresh in flight; a refresh that escalates or needs a
+        # continuation makes more than one, so the last ones in flight can overrun the budget slightly
+        committed = 0
+
+        async def worker():
+            nonlocal committed
+            for member, cache_key, _ in queue:
+                if committed >= self.budget:
+                    result["over_budget"] += 1
+                    continue
+                committed += 1
+                calls = [0]
+                model_calls.set(calls)
+                try:
+                    recipe = await refresh(*json.loads(member))
+                except Exception as e:
+                    result["failed"] += 1
+                    WARMER_REFRESHES.labels("error").inc()
+                    logger.warning(f"Failed to warm {cache_key}: {str(e)}")
+                else:
+                    # None: another replica is already refreshing it
+                    outcome = "refreshed" if recipe is not None else "skipped"
+                    result[outcome] += 1
+                    WARMER_REFRESHES.labels("ok" if recipe is not None else "skipped").inc()
+                finally:
+                    committed += calls[0] - 1
+                    result["model_calls"] += calls[0]
+
+        await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+        WARMER_REFRESHES.labels("over_budget").inc(result["over_budget"])
+        if self.decay < 1:
+            await redis_client.zunionstore(self.key, {self.key: self.decay})
+        result["seconds"] = round(time.monotonic() - start, 3)
+        result["finished_at"] = datetime.now(timezone.utc).isoformat()
+        self.last_run = result
+        logger.info(
+            f"Cache warming refreshed {result['refreshed']} of {result['candidates']} stale popular recipes "
+            f"with {result['model_calls']} model calls ({result['skipped']} already refreshing, {result['failed']} failed, "
+            f"{result['over_budget']} over budget)"
+        )
+        return result
+
+    async def run(self, redis_client, refresh: Callable[[List[str], Optional[str], List[str]], Awaitable], enabled: bool):
+        # Flush counts continuously; warm at most once per interval across all replicas
+        next_check = time.monotonic() + self.flush_interval
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush(redis_client)
+                if not enabled or time.monotonic() < next_check or not self.off_peak():
+                    continue
+                next_check = time.monotonic() + self.interval
+                if await redis_client.set(f"{self.key}:lease", "1", nx=True, ex=int(self.interval)):
+                    await self.warm(redis_client, refresh)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Cache warmer error: {str(e)}")
+
+    def snapshot(self) -> Dict:
+        return {
+            "top_n": self.top_n,
+            "budget": self.budget,
+            "pending_counts": sum(self.pending.values()),
+            "last_run": self.last_run,
+        }
+
+async def run_once(args):
+    import main as app
+
+    warmer = app.cache_warmer
+    warmer.top_n = args.top
+    warmer.budget = args.budget
+    await app.startup()
+    try:
+        if args.dry_run:
+            candidates = await warmer.plan(app.redis_client)
+            for member, cache_key, score in candidates[:args.budget]:
+                print(f"{score:>8.1f}  {cache_key}  {member}")
+            print(f"{len(candidates)} stale of the top {args.top}, {min(len(candidates), args.budget)} within budget")
+        else:
+            print(json.dumps(await warmer.warm(app.redis_client, app.warm_recipe), indent=2))
+    finally:
+        await app.shutdown()
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--top", type=int, default=100, help="how many of the most requested entries to consider")
+    parser.add_argument("--budget", type=int, default=50, help="maximum model calls for this run")
+    parser.add_argument("--dry-run", action="store_true", help="list what would be regenerated")
+    asyncio.run(run_once(parser.parse_args()))